@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from main import app, get_db_connection, get_table_indexes, find_redundant_indexes
+
+FIRST_NAMES = ["Anna", "Adam", "Bartek", "Celina", "Dorota", "Emil", "Ewa", "Filip", "Hanna",
+               "Igor", "Julia", "Kamil", "Lena", "Marek", "Natalia", "Olga", "Piotr", "Zofia"]
+LAST_NAMES = ["Nowak", "Kowalski", "Wisniewski", "Wojcik", "Kaminski", "Lewandowski",
+              "Zielinski", "Szymanski", "Wozniak", "Dabrowski"]
+
+# Indexes tried one at a time on top of the table's own PK / UNIQUE(email)
+CANDIDATE_INDEXES = {
+    "idx_email": "(email)",
+    "idx_name": "(name)",
+    "idx_name_email": "(name, email)",
+}
+
+
+def cleanup_emails(prefix):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM mysqli_users WHERE email LIKE %s;", (prefix + "%",))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def synthetic_users(prefix, count):
+    return [{"name": f"Bench User {i}", "email": f"{prefix}{i}@bench.example"} for i in range(count)]
+
+
+# Insert throughput: one POST /users per row vs POST /users/bulk
+def bench_inserts(count, chunk_size):
+    client = app.test_client()
+    report = {}
+
+    prefix = f"single-{uuid.uuid4().hex[:8]}-"
+    users = synthetic_users(prefix, count)
+    started = time.perf_counter()
+    for user in users:
+        client.post('/users', json=user)
+    elapsed = time.perf_counter() - started
+    report["single_row"] = {"rows": count, "seconds": round(elapsed, 3), "rows_per_sec": round(count / elapsed, 1)}
+    cleanup_emails(prefix)
+
+    for mode in ('best_effort', 'atomic'):
+        prefix = f"bulk-{uuid.uuid4().hex[:8]}-"
+        users = synthetic_users(prefix, count)
+        started = time.perf_counter()
+        res = client.post(f'/users/bulk?mode={mode}&chunk_size={chunk_size}', json=users)
+        elapsed = time.perf_counter() - started
+        body = res.get_json()
+        report[f"bulk_{mode}"] = {
+            "rows": count,
+            "inserted": body.get("inserted"),
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(count / elapsed, 1),
+        }
+        cleanup_emails(prefix)
+
+    report["speedup_best_effort"] = round(report["bulk_best_effort"]["rows_per_sec"] / report["single_row"]["rows_per_sec"], 1)
+    return report
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "count": len(ordered)}
+
+
+def synthetic_row(i):
+    return (f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}",
+            f"user{i}@example{i % 97}.com")
+
+
+# Seeding: the benchmark table is created LIKE mysqli_users (same columns and
+# indexes, no triggers), so millions of synthetic rows neither touch the
+# application data nor flood mysqli_logs.
+def seed_table(cursor, conn, table, rows, batch_size):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} LIKE mysqli_users;")
+    cursor.execute(f"SELECT COUNT(*) FROM {table};")
+    existing = cursor.fetchone()[0]
+    if existing >= rows:
+        print(f"{table} already has {existing} rows.")
+        return existing
+
+    started = time.perf_counter()
+    cursor.execute("SET SESSION unique_checks = 0;")
+    for start in range(existing, rows, batch_size):
+        batch = [synthetic_row(i) for i in range(start, min(start + batch_size, rows))]
+        values = ", ".join(["(%s, %s)"] * len(batch))
+        cursor.execute(f"INSERT INTO {table} (name, email) VALUES {values};", [v for row in batch for v in row])
+        conn.commit()
+    cursor.execute("SET SESSION unique_checks = 1;")
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {rows - existing} rows into {table} in {elapsed:.1f}s ({(rows - existing) / elapsed:.0f} rows/s).")
+    return rows
+
+
+def run_workloads(cursor, table, rows, queries, rng):
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table};")
+    min_id, max_id = cursor.fetchone()
+
+    def id_range():
+        lo = rng.randint(min_id, max(min_id, max_id - 100))
+        return f"SELECT id, name, email FROM {table} WHERE id BETWEEN %s AND %s;", (lo, lo + 100)
+
+    workloads = {
+        "email_eq": lambda: (f"SELECT id, name, email FROM {table} WHERE email = %s;",
+                             (synthetic_row(rng.randrange(rows))[1],)),
+        "name_prefix": lambda: (f"SELECT id, name, email FROM {table} WHERE name LIKE %s LIMIT 50;",
+                                (rng.choice(FIRST_NAMES)[:3] + "%",)),
+        "id_range": id_range,
+    }
+    results = {}
+    for name, make_query in workloads.items():
+        sql, params = make_query()
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = [d[0] for d in cursor.description]
+        explain = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        samples = []
+        for _ in range(queries):
+            sql, params = make_query()
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            samples.append(time.perf_counter() - started)
+        results[name] = {"latency": percentiles(samples), "explain": explain}
+    return results
+
+
+def measure_insert_cost(cursor, conn, table, rows, batch_size=500):
+    # Insert and then remove `rows` extra rows, timing only the inserts
+    prefix = f"cost-{uuid.uuid4().hex[:8]}-"
+    started = time.perf_counter()
+    for start in range(0, rows, batch_size):
+        n = min(batch_size, rows - start)
+        values = ", ".join(["(%s, %s)"] * n)
+        params = []
+        for i in range(start, start + n):
+            params += [f"Cost {i}", f"{prefix}{i}@bench.example"]
+        cursor.execute(f"INSERT INTO {table} (name, email) VALUES {values};", params)
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    cursor.execute(f"DELETE FROM {table} WHERE email LIKE %s;", (prefix + "%",))
+    conn.commit()
+    return {"rows": rows, "rows_per_sec": round(rows / elapsed, 1)}
+
+
+def drop_index_if_exists(cursor, table, name):
+    try:
+        cursor.execute(f"DROP INDEX {name} ON {table};")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_CANT_DROP_FIELD_OR_KEY:
+            raise
+
+
+def bench_indexes(table, rows, queries, insert_rows, batch_size, seed, output):
+    rng = random.Random(seed)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        rows = seed_table(cursor, conn, table, rows, batch_size)
+        cursor.execute("SELECT VERSION();")
+        version = cursor.fetchone()[0]
+
+        original = get_table_indexes(cursor, table)
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "server_version": version,
+            "table": table,
+            "rows": rows,
+            "queries_per_workload": queries,
+            "seed": seed,
+            "existing_indexes": original,
+            "redundant_indexes": find_redundant_indexes(original),
+            "configurations": {},
+        }
+
+        # Baseline: only the indexes that are not benchmark candidates
+        for name in CANDIDATE_INDEXES:
+            drop_index_if_exists(cursor, table, name)
+        configurations = [("baseline", None)] + [(name, name) for name in CANDIDATE_INDEXES]
+        for label, index in configurations:
+            if index:
+                print(f"Creating {index} {CANDIDATE_INDEXES[index]} ...")
+                cursor.execute(f"CREATE INDEX {index} ON {table} {CANDIDATE_INDEXES[index]};")
+            cursor.execute(f"ANALYZE TABLE {table};")
+            cursor.fetchall()
+            indexes = get_table_indexes(cursor, table)
+            report["configurations"][label] = {
+                "indexes": sorted(indexes),
+                "redundant_indexes": find_redundant_indexes(indexes),
+                "workloads": run_workloads(cursor, table, rows, queries, rng),
+                "insert_cost": measure_insert_cost(cursor, conn, table, insert_rows),
+            }
+            if index:
+                drop_index_if_exists(cursor, table, index)
+            print(f"Finished configuration {label}.")
+
+        # Put back whatever candidate indexes the table had before
+        for name in CANDIDATE_INDEXES:
+            if name in original:
+                cursor.execute(f"CREATE INDEX {name} ON {table} {CANDIDATE_INDEXES[name]};")
+    finally:
+        cursor.close()
+        conn.close()
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {output}")
+    return report
+
+
+def summarize_indexes(report):
+    lines = []
+    for label, conf in report["configurations"].items():
+        lat = ", ".join(f"{w} p50={r['latency']['p50_ms']}ms p99={r['latency']['p99_ms']}ms"
+                        for w, r in conf["workloads"].items())
+        lines.append(f"{label:16} inserts={conf['insert_cost']['rows_per_sec']} rows/s  {lat}")
+    for red in report["redundant_indexes"]:
+        lines.append(f"redundant: {red['index']} {red['columns']} is covered by {red['covered_by']}")
+    return "\n".join(lines)
+
+
+# Serving: cold start and throughput of the dev server vs the production mode
+SERVER_MODES = {
+    "dev": [],
+    "production": ["--production"],
+}
+
+
+def wait_until_up(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as res:
+                if res.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.02)
+    return False
+
+
+def load_test(url, clients, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=10) as res:
+                    res.read()
+                local.append(time.perf_counter() - started)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    result = {"requests": len(latencies), "errors": errors, "requests_per_sec": round(len(latencies) / elapsed, 1)}
+    if latencies:
+        result.update(percentiles(latencies))
+    return result
+
+
+def bench_serving(modes, port, clients, duration, workers, threads):
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = {}
+    for mode in modes:
+        cmd = [sys.executable, os.path.join(here, "main.py"), "serve", "--port", str(port)] + SERVER_MODES[mode]
+        if mode == "production":
+            cmd += ["--workers", str(workers), "--threads", str(threads)]
+        started = time.perf_counter()
+        # Own process group, so the debug reloader's child is stopped too
+        proc = subprocess.Popen(cmd, cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+        try:
+            if not wait_until_up(f"http://127.0.0.1:{port}/pool", timeout=60):
+                report[mode] = {"error": "server did not start"}
+                continue
+            cold_start = time.perf_counter() - started
+            result = load_test(f"http://127.0.0.1:{port}/users?limit=50", clients, duration)
+            result["cold_start_ms"] = round(cold_start * 1000, 1)
+            report[mode] = result
+            print(f"{mode}: {result}")
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="task1 benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ins = sub.add_parser("inserts", help="compare single-row and bulk insert throughput")
+    p_ins.add_argument("--rows", type=int, default=5000)
+    p_ins.add_argument("--chunk-size", type=int, default=1000)
+
+    p_idx = sub.add_parser("indexes", help="seed a table and compare lookup latency per candidate index")
+    p_idx.add_argument("--table", default="mysqli_users_bench",
+                       help="table to seed and benchmark (created LIKE mysqli_users)")
+    p_idx.add_argument("--rows", type=int, default=100_000)
+    p_idx.add_argument("--queries", type=int, default=1000, help="queries per workload")
+    p_idx.add_argument("--insert-rows", type=int, default=10_000, help="rows used to measure insert cost")
+    p_idx.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT while seeding")
+    p_idx.add_argument("--seed", type=int, default=42)
+    p_idx.add_argument("--output", default="index_benchmark.json")
+
+    p_srv = sub.add_parser("serve", help="compare cold start and requests/sec of the dev and production servers")
+    p_srv.add_argument("--modes", nargs="+", choices=sorted(SERVER_MODES), default=["dev", "production"])
+    p_srv.add_argument("--port", type=int, default=5055)
+    p_srv.add_argument("--clients", type=int, default=32, help="concurrent client threads")
+    p_srv.add_argument("--duration", type=float, default=15, help="seconds of load per mode")
+    p_srv.add_argument("--workers", type=int, default=4)
+    p_srv.add_argument("--threads", type=int, default=8)
+
+    args = parser.parse_args()
+    if args.command == "inserts":
+        print(json.dumps(bench_inserts(args.rows, args.chunk_size), indent=2))
+    elif args.command == "indexes":
+        report = bench_indexes(args.table, args.rows, args.queries, args.insert_rows,
+                               args.batch_size, args.seed, args.output)
+        print(summarize_indexes(report))
+    elif args.command == "serve":
+        print(json.dumps(bench_serving(args.modes, args.port, args.clients, args.duration,
+                                       args.workers, args.threads), indent=2))
+
+
+if __name__ == '__main__':
+    main()
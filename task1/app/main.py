@@ -1,7 +1,15 @@
 import mysql.connector
 from mysql.connector import errorcode
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template_string
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import argparse
+import bisect
+import json
+import os
+import queue
 import threading
+import time
 
 
 DB_CONFIG = {
@@ -12,107 +20,816 @@ DB_CONFIG = {
     "database": "python_db"
 }
 
+# Connection pool settings (can be overridden from the environment)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))         # max seconds to wait for a free connection
+POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", 1800))      # reopen connections older than this
+POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 5))   # ping connections idle longer than this
+
+
+class PooledConnection:
+    """Wraps a raw connection so that close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        return InstrumentedCursor(cursor) if METRICS_ENABLED else cursor
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def discard(self):
+        # Drop the connection instead of returning it, e.g. when a streamed
+        # result was abandoned halfway and the socket still has unread rows.
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.discard(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of mysql.connector connections.
+
+    Connections are opened lazily up to `size`. A borrower waits at most
+    `timeout` seconds for a free slot and gets a PoolError after that, which
+    the routes already handle as a mysql.connector.Error.
+    """
+
+    def __init__(self, config, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_after=POOL_PING_AFTER):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._born = {}       # id(raw) -> time the connection was opened
+        self._last_used = {}  # id(raw) -> time the connection was returned
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "dead": 0,
+            "waits": 0,
+            "exhausted": 0,
+            "in_use": 0,
+        }
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def _open(self):
+        raw = mysql.connector.connect(**self.config)
+        now = time.monotonic()
+        self._born[id(raw)] = now
+        self._last_used[id(raw)] = now
+        self._count("created")
+        return raw
+
+    def _discard(self, raw):
+        self._born.pop(id(raw), None)
+        self._last_used.pop(id(raw), None)
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def _is_usable(self, raw):
+        now = time.monotonic()
+        if self.recycle and now - self._born.get(id(raw), now) > self.recycle:
+            self._count("recycled")
+            return False
+        if now - self._last_used.get(id(raw), now) >= self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._count("dead")
+                return False
+        return True
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count("exhausted")
+                raise mysql.connector.errors.PoolError(
+                    f"Connection pool exhausted ({self.size} connections busy for {self.timeout}s)"
+                )
+        try:
+            while True:
+                try:
+                    raw = self._idle.get_nowait()
+                except queue.Empty:
+                    raw = self._open()
+                    break
+                if self._is_usable(raw):
+                    self._count("reused")
+                    break
+                self._discard(raw)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._count("in_use")
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        self._count("in_use", -1)
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            self._last_used[id(raw)] = time.monotonic()
+            self._idle.put(raw)
+        except mysql.connector.Error:
+            self._count("dead")
+            self._discard(raw)
+        finally:
+            self._slots.release()
+
+    def discard(self, raw):
+        self._count("in_use", -1)
+        self._discard(raw)
+        self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data["size"] = self.size
+        data["idle"] = self._idle.qsize()
+        return data
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG)
+    return _pool
+
+
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    if not METRICS_ENABLED:
+        return get_pool().acquire()
+    started = time.perf_counter()
+    try:
+        return get_pool().acquire()
+    except mysql.connector.Error as err:
+        count_db_error(err)
+        raise
+    finally:
+        observe_phase("connect", time.perf_counter() - started)
+
+
+def reset_pool_after_fork():
+    # A forked worker must not share the parent's sockets. The inherited
+    # connections are only forgotten, closing them would send COM_QUIT on
+    # sockets the parent still uses.
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_pool_after_fork)
 
-def setup_logging_and_triggers():
-    setup_statements = [
-        # Create logs table if not exists
+CREATE_USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS mysqli_users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100),
+    email VARCHAR(100) UNIQUE
+);
+"""
+
+# Each entry is a single statement (trigger bodies included), so no multi=True
+LOGGING_SETUP_STATEMENTS = [
+    # Create logs table if not exists
+    """
+    CREATE TABLE IF NOT EXISTS mysqli_logs (
+        log_id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        action_type ENUM('INSERT', 'UPDATE', 'DELETE'),
+        action_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # Trigger: after insert
+    """
+    CREATE TRIGGER IF NOT EXISTS after_user_insert
+    AFTER INSERT ON mysqli_users
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO mysqli_logs (user_id, action_type)
+        VALUES (NEW.id, 'INSERT');
+    END;
+    """,
+    # Trigger: after update
+    """
+    CREATE TRIGGER IF NOT EXISTS after_user_update
+    AFTER UPDATE ON mysqli_users
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO mysqli_logs (user_id, action_type)
+        VALUES (NEW.id, 'UPDATE');
+    END;
+    """,
+    # Trigger: after delete
+    """
+    CREATE TRIGGER IF NOT EXISTS after_user_delete
+    AFTER DELETE ON mysqli_users
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO mysqli_logs (user_id, action_type)
+        VALUES (OLD.id, 'DELETE');
+    END;
+    """,
+]
+
+def get_table_indexes(cursor, table):
+    # {index_name: {"columns": [...], "unique": bool}} from information_schema
+    cursor.execute(
         """
-        CREATE TABLE IF NOT EXISTS mysqli_logs (
-            log_id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            action_type ENUM('INSERT', 'UPDATE', 'DELETE'),
-            action_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+        SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX;
         """,
-        # Trigger: after insert
+        (table,),
+    )
+    indexes = {}
+    for name, column, non_unique in cursor.fetchall():
+        entry = indexes.setdefault(name, {"columns": [], "unique": not non_unique})
+        entry["columns"].append(column)
+    return indexes
+
+
+def find_redundant_indexes(indexes):
+    """Indexes whose columns are a leading prefix of another index.
+
+    A unique index is only reported when the covering index is unique as
+    well, otherwise it still enforces a constraint the other one does not.
+    """
+    redundant = []
+    for name, idx in indexes.items():
+        if name == "PRIMARY":
+            continue
+        for other_name, other in indexes.items():
+            if other_name == name:
+                continue
+            if other["columns"][:len(idx["columns"])] != idx["columns"]:
+                continue
+            if idx["unique"] and not other["unique"]:
+                continue
+            # Identical definitions: keep the first name alphabetically (or the PK)
+            if other["columns"] == idx["columns"] and other["unique"] == idx["unique"] \
+                    and other_name != "PRIMARY" and other_name > name:
+                continue
+            redundant.append({"index": name, "columns": idx["columns"], "covered_by": other_name})
+            break
+    return redundant
+
+
+# --- mysqli_logs management: partitions, retention and daily rollups ---
+LOG_PARTITIONING = os.environ.get("LOG_PARTITIONING", "1") == "1"
+LOG_PARTITION_DAYS_AHEAD = int(os.environ.get("LOG_PARTITION_DAYS_AHEAD", 7))
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 90))
+LOG_ARCHIVE = os.environ.get("LOG_ARCHIVE", "0") == "1"
+# Rows newer than this many seconds are left to the next rollup run, so a
+# transaction that got its log_id earlier but committed later is not skipped.
+LOG_ROLLUP_LAG = int(os.environ.get("LOG_ROLLUP_LAG", 5))
+LOG_DELETE_BATCH = 10000
+
+LOG_MANAGEMENT_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS mysqli_logs_daily (
+        day DATE NOT NULL,
+        action_type ENUM('INSERT', 'UPDATE', 'DELETE') NOT NULL,
+        actions INT UNSIGNED NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, action_type)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS mysqli_logs_rollup_state (
+        id TINYINT PRIMARY KEY,
+        last_log_id BIGINT NOT NULL
+    );
+    """,
+    "INSERT IGNORE INTO mysqli_logs_rollup_state (id, last_log_id) VALUES (1, 0);",
+]
+
+
+def partition_name(day):
+    return "p" + day.strftime("%Y%m%d")
+
+
+def get_log_partitions(cursor):
+    # [(name, upper_bound or None for MAXVALUE)] in partition order; [] if not partitioned
+    cursor.execute(
         """
-        CREATE TRIGGER IF NOT EXISTS after_user_insert
-        AFTER INSERT ON mysqli_users
-        FOR EACH ROW
-        BEGIN
-            INSERT INTO mysqli_logs (user_id, action_type)
-            VALUES (NEW.id, 'INSERT');
-        END;
-        """,
-        # Trigger: after update
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'mysqli_logs'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION;
         """
-        CREATE TRIGGER IF NOT EXISTS after_user_update
-        AFTER UPDATE ON mysqli_users
-        FOR EACH ROW
-        BEGIN
-            INSERT INTO mysqli_logs (user_id, action_type)
-            VALUES (NEW.id, 'UPDATE');
-        END;
-        """,
-        # Trigger: after delete
+    )
+    return [(name, None if desc == "MAXVALUE" else int(desc)) for name, desc in cursor.fetchall()]
+
+
+def daily_partition_defs(cursor, first_day, days):
+    defs = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        cursor.execute("SELECT UNIX_TIMESTAMP(%s);", (day + timedelta(days=1),))
+        defs.append(f"PARTITION {partition_name(day)} VALUES LESS THAN ({cursor.fetchone()[0]})")
+    return defs
+
+
+def partition_mysqli_logs(cursor):
+    # The partitioning column has to be part of every unique key, hence the
+    # (log_id, action_time) primary key. log_id stays first for AUTO_INCREMENT.
+    cursor.execute("SELECT CURDATE(), UNIX_TIMESTAMP(CURDATE());")
+    today, today_ts = cursor.fetchone()
+    cursor.execute(
+        """
+        ALTER TABLE mysqli_logs
+            MODIFY action_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (log_id, action_time);
         """
-        CREATE TRIGGER IF NOT EXISTS after_user_delete
-        AFTER DELETE ON mysqli_users
-        FOR EACH ROW
-        BEGIN
-            INSERT INTO mysqli_logs (user_id, action_type)
-            VALUES (OLD.id, 'DELETE');
-        END;
+    )
+    defs = [f"PARTITION phistory VALUES LESS THAN ({today_ts})"]
+    defs += daily_partition_defs(cursor, today, LOG_PARTITION_DAYS_AHEAD + 1)
+    defs.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    cursor.execute(
+        "ALTER TABLE mysqli_logs PARTITION BY RANGE (UNIX_TIMESTAMP(action_time)) (" + ", ".join(defs) + ");"
+    )
+
+
+def ensure_log_partitions(cursor):
+    # Split pmax so that there is a daily partition up to LOG_PARTITION_DAYS_AHEAD
+    partitions = get_log_partitions(cursor)
+    daily = [name for name, _ in partitions if name.startswith("p2")]
+    cursor.execute("SELECT CURDATE();")
+    today = cursor.fetchone()[0]
+    last_day = datetime.strptime(daily[-1][1:], "%Y%m%d").date() if daily else today - timedelta(days=1)
+    first_day = max(last_day + timedelta(days=1), today)
+    days = (today + timedelta(days=LOG_PARTITION_DAYS_AHEAD) - first_day).days + 1
+    if days <= 0:
+        return 0
+    defs = daily_partition_defs(cursor, first_day, days)
+    defs.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    cursor.execute("ALTER TABLE mysqli_logs REORGANIZE PARTITION pmax INTO (" + ", ".join(defs) + ");")
+    return days
+
+
+def apply_log_management(cursor):
+    for stmt in LOG_MANAGEMENT_STATEMENTS:
+        cursor.execute(stmt)
+    indexes = get_table_indexes(cursor, "mysqli_logs")
+    if "idx_logs_user" not in indexes:
+        # History lookups: WHERE user_id = ? ORDER BY log_id DESC
+        cursor.execute("CREATE INDEX idx_logs_user ON mysqli_logs (user_id, log_id);")
+    if not LOG_PARTITIONING and "idx_logs_time" not in indexes:
+        cursor.execute("CREATE INDEX idx_logs_time ON mysqli_logs (action_time);")
+    if LOG_PARTITIONING:
+        if not get_log_partitions(cursor):
+            partition_mysqli_logs(cursor)
+            print("mysqli_logs partitioned by day.")
+        else:
+            ensure_log_partitions(cursor)
+
+
+def rollup_logs(cursor, conn):
+    """Fold log rows newer than the last processed log_id into mysqli_logs_daily."""
+    cursor.execute("SELECT last_log_id FROM mysqli_logs_rollup_state WHERE id = 1 FOR UPDATE;")
+    last_log_id = cursor.fetchone()[0]
+    cursor.execute(
+        """
+        SELECT COALESCE(MAX(log_id), %s) FROM mysqli_logs
+        WHERE log_id > %s AND action_time < NOW() - INTERVAL %s SECOND;
         """,
-    ]
+        (last_log_id, last_log_id, LOG_ROLLUP_LAG),
+    )
+    upto = cursor.fetchone()[0]
+    if upto > last_log_id:
+        cursor.execute(
+            """
+            INSERT INTO mysqli_logs_daily (day, action_type, actions)
+            SELECT DATE(action_time), action_type, COUNT(*) FROM mysqli_logs
+            WHERE log_id > %s AND log_id <= %s
+            GROUP BY DATE(action_time), action_type
+            ON DUPLICATE KEY UPDATE actions = actions + VALUES(actions);
+            """,
+            (last_log_id, upto),
+        )
+        cursor.execute("UPDATE mysqli_logs_rollup_state SET last_log_id = %s WHERE id = 1;", (upto,))
+    conn.commit()
+    return upto - last_log_id
+
+
+def purge_old_logs(cursor, conn, retention_days=LOG_RETENTION_DAYS, archive=LOG_ARCHIVE):
+    """Remove log rows older than retention_days, whole partitions at a time."""
+    cursor.execute("SELECT UNIX_TIMESTAMP(CURDATE() - INTERVAL %s DAY);", (retention_days,))
+    cutoff = cursor.fetchone()[0]
+    if archive:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mysqli_logs_archive (
+                log_id INT NOT NULL,
+                user_id INT,
+                action_type ENUM('INSERT', 'UPDATE', 'DELETE'),
+                action_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (log_id, action_time)
+            );
+            """
+        )
+
+    partitions = get_log_partitions(cursor)
+    if partitions:
+        expired = [name for name, bound in partitions if bound is not None and bound <= cutoff]
+        if archive:
+            for name in expired:
+                cursor.execute(f"INSERT IGNORE INTO mysqli_logs_archive SELECT * FROM mysqli_logs PARTITION ({name});")
+                conn.commit()
+        if expired:
+            cursor.execute("ALTER TABLE mysqli_logs DROP PARTITION " + ", ".join(expired) + ";")
+        return {"dropped_partitions": expired}
 
+    # Unpartitioned fallback: bounded deletes. Each batch is the LOG_DELETE_BATCH
+    # expired rows with the lowest log_ids; archive and delete both select it
+    # as "expired and log_id <= last", so they cannot pick different rows when
+    # many share one action_time.
+    deleted = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT MAX(log_id) FROM (
+                SELECT log_id FROM mysqli_logs WHERE action_time < FROM_UNIXTIME(%s)
+                ORDER BY log_id LIMIT %s
+            ) AS batch;
+            """,
+            (cutoff, LOG_DELETE_BATCH),
+        )
+        last_id = cursor.fetchone()[0]
+        if last_id is None:
+            return {"deleted_rows": deleted}
+        if archive:
+            cursor.execute(
+                """
+                INSERT IGNORE INTO mysqli_logs_archive
+                SELECT * FROM mysqli_logs WHERE action_time < FROM_UNIXTIME(%s) AND log_id <= %s;
+                """,
+                (cutoff, last_id),
+            )
+        cursor.execute(
+            "DELETE FROM mysqli_logs WHERE action_time < FROM_UNIXTIME(%s) AND log_id <= %s;",
+            (cutoff, last_id),
+        )
+        batch = cursor.rowcount
+        conn.commit()
+        deleted += batch
+        if batch < LOG_DELETE_BATCH:
+            return {"deleted_rows": deleted}
+
+
+def run_log_maintenance(retention_days=LOG_RETENTION_DAYS, archive=LOG_ARCHIVE):
+    # Rollup first so purged rows are already counted in mysqli_logs_daily.
+    # GET_LOCK keeps several workers / cron runs from doing this twice.
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        for stmt in setup_statements:
-            for result in cursor.execute(stmt, multi=True):
-                pass  # execute all parts
-        conn.commit()
-        print("Logging table and triggers set up successfully.")
-    except mysql.connector.Error as err:
-        print(f"Error during setup: {err}")
+        cursor.execute("SELECT GET_LOCK('mysqli_logs_maintenance', 0);")
+        if not cursor.fetchone()[0]:
+            print("Log maintenance already running elsewhere, skipping.")
+            return None
+        try:
+            report = {"rolled_up": rollup_logs(cursor, conn)}
+            if get_log_partitions(cursor):
+                report["created_partitions"] = ensure_log_partitions(cursor)
+            report.update(purge_old_logs(cursor, conn, retention_days, archive))
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('mysqli_logs_maintenance');")
+            cursor.fetchall()
+        print(f"Log maintenance finished: {report}")
+        return report
     finally:
         cursor.close()
         conn.close()
 
-def ensure_users_table():
-    create_users = """
-    CREATE TABLE IF NOT EXISTS mysqli_users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(100),
-        email VARCHAR(100) UNIQUE
-    );
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# --- Versioned schema migrations ---
+# Steps are SQL statements or callables taking a cursor. Every step must be
+# safe to re-run: DDL commits implicitly, so a crash between a step and its
+# schema_version row means the step runs again on the next boot.
+SCHEMA_MIGRATIONS = [
+    (1, "mysqli_users table", [CREATE_USERS_TABLE]),
+    (2, "mysqli_logs table and audit triggers", LOGGING_SETUP_STATEMENTS),
+    (3, "mysqli_logs partitions, indexes and daily rollup", [apply_log_management]),
+]
+SCHEMA_LOCK_TIMEOUT = 60
+
+
+def get_schema_version(cursor):
     try:
-        cursor.execute(create_users)
-        conn.commit()
-        print("mysqli_users table ensured.")
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+        return cursor.fetchone()[0]
     except mysql.connector.Error as err:
-        print(f"Error ensuring users table: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+
 
-def add_email_index():
-    idx_stmt = "CREATE INDEX IF NOT EXISTS idx_email ON mysqli_users(email);"
-    # MySQL doesn't support IF NOT EXISTS for CREATE INDEX in older versions.
-    # Trying to create and ignore error if exists.
+def migrate():
+    """Bring the schema up to date in one connection; a single query when it already is."""
+    started = time.perf_counter()
+    latest = SCHEMA_MIGRATIONS[-1][0]
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("CREATE INDEX idx_email ON mysqli_users(email);")
-        conn.commit()
-        print("Index idx_email created on mysqli_users(email).")
-    except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_DUP_KEYNAME:
-            print("Index idx_email already exists.")
-        else:
-            print(f"Error creating index: {err}")
+        current = get_schema_version(cursor)
+        if current >= latest:
+            print(f"Schema is at version {current} ({(time.perf_counter() - started) * 1000:.1f} ms).")
+            return current
+
+        # Several workers may boot at once; only one of them migrates
+        cursor.execute("SELECT GET_LOCK('mysqli_schema_migrate', %s);", (SCHEMA_LOCK_TIMEOUT,))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Timed out waiting for another process to finish migrating")
+        try:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            current = get_schema_version(cursor)
+            for version, description, steps in SCHEMA_MIGRATIONS:
+                if version <= current:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s);",
+                    (version, description),
+                )
+                conn.commit()
+                current = version
+                print(f"Applied migration {version}: {description}")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('mysqli_schema_migrate');")
+            cursor.fetchall()
+        print(f"Schema migrated to version {current} ({(time.perf_counter() - started) * 1000:.1f} ms).")
+        return current
     finally:
         cursor.close()
         conn.close()
 
 app = Flask(__name__)
 
+
+# --- Metrics: per-route latency, DB phase timers, row and error counters ---
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Log requests slower than this (ms) together with their SQL; 0 disables it
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_LOG_SQL_MAX_LEN = 500
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        names = self.labels + ("le",)
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(names, label_values + (bound,))} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency per route.", ("route", "method"))
+REQUESTS_TOTAL = Counter("http_requests_total", "Requests per route and status.", ("route", "method", "status"))
+DB_PHASE_LATENCY = Histogram("db_phase_duration_seconds",
+                             "Time spent acquiring connections, executing queries, fetching rows and serializing.",
+                             ("route", "phase"))
+ROWS_RETURNED = Counter("db_rows_returned_total", "Rows fetched from MariaDB per route.", ("route",))
+DB_ERRORS = Counter("db_errors_total", "mysql.connector errors by errno.", ("errno",))
+
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "none"
+
+
+def observe_phase(phase, seconds, route=None):
+    DB_PHASE_LATENCY.observe(seconds, route or current_route(), phase)
+
+
+def count_db_error(err):
+    DB_ERRORS.inc(str(err.errno) if getattr(err, "errno", None) else "none")
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute/fetch calls and counts rows and errors."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        # Streamed responses are fetched after the request context is gone
+        self._route = current_route()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, operation, params=None, **kwargs):
+        if SLOW_REQUEST_MS and has_request_context():
+            g.setdefault("sql_statements", []).append(operation.strip()[:SLOW_LOG_SQL_MAX_LEN])
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, **kwargs)
+        except mysql.connector.Error as err:
+            count_db_error(err)
+            raise
+        finally:
+            observe_phase("query", time.perf_counter() - started, self._route)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            result = method(*args)
+        except mysql.connector.Error as err:
+            count_db_error(err)
+            raise
+        finally:
+            observe_phase("fetch", time.perf_counter() - started, self._route)
+        if isinstance(result, list):
+            ROWS_RETURNED.inc(self._route, amount=len(result))
+        elif result is not None:
+            ROWS_RETURNED.inc(self._route)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+
+def timed_dumps(payload, route=None):
+    if not METRICS_ENABLED:
+        return json.dumps(payload)
+    started = time.perf_counter()
+    body = json.dumps(payload)
+    observe_phase("serialize", time.perf_counter() - started, route)
+    return body
+
+
+def json_response(payload, status=200):
+    return Response(timed_dumps(payload), status=status, mimetype='application/json')
+
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = current_route()
+    REQUEST_LATENCY.observe(elapsed, route, request.method)
+    REQUESTS_TOTAL.inc(route, request.method, str(response.status_code))
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning(
+            "Slow request %s %s took %.1f ms; SQL: %s",
+            request.method, request.full_path, elapsed * 1000, g.get("sql_statements", []),
+        )
+    return response
+
+
+def record_failed_request(exc):
+    # Safety net for requests that failed before after_request could record them
+    if exc is not None and "request_started" in g:
+        record_request(Response(status=500))
+
+
+if METRICS_ENABLED:
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+    app.teardown_request(record_failed_request)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUESTS_TOTAL, DB_PHASE_LATENCY, ROWS_RETURNED, DB_ERRORS):
+        lines += metric.render()
+
+    pool = get_pool().snapshot()
+    for key in ("created", "reused", "recycled", "dead", "waits", "exhausted"):
+        lines += [f"# TYPE db_pool_{key}_total counter", f"db_pool_{key}_total {pool[key]}"]
+    for key in ("size", "idle", "in_use"):
+        lines += [f"# TYPE db_pool_{key} gauge", f"db_pool_{key} {pool[key]}"]
+
+    cache = read_cache.snapshot()
+    for key in ("hits", "misses", "stale", "expired", "evictions"):
+        lines += [f"# TYPE user_cache_{key}_total counter", f"user_cache_{key}_total {cache[key]}"]
+    for key in ("entries", "bytes"):
+        lines += [f"# TYPE user_cache_{key} gauge", f"user_cache_{key} {cache[key]}"]
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 # Simple in-file HTML for the optional UI
 HTML_PAGE = """
 <!doctype html>
@@ -122,6 +839,7 @@ HTML_PAGE = """
     <h1>User Management API (Demo UI)</h1>
     <h2>All Users</h2>
     <button onclick="fetchUsers()">Refresh</button>
+    <button id="more" onclick="fetchMoreUsers()" disabled>Load more</button>
     <pre id="users"></pre>
 
     <h2>Add User</h2>
@@ -138,10 +856,23 @@ HTML_PAGE = """
     </form>
 
     <script>
+      const PAGE_SIZE = 50;
+      let loadedUsers = [];
+      let nextAfterId = null;
+
       async function fetchUsers(){
-        const res = await fetch('/users');
-        const data = await res.json();
-        document.getElementById('users').textContent = JSON.stringify(data, null, 2);
+        loadedUsers = [];
+        nextAfterId = 0;
+        await fetchMoreUsers();
+      }
+      async function fetchMoreUsers(){
+        if (nextAfterId === null) return;
+        const res = await fetch('/users?limit=' + PAGE_SIZE + '&after_id=' + nextAfterId);
+        const page = await res.json();
+        loadedUsers = loadedUsers.concat(page.users);
+        nextAfterId = page.next_after_id;
+        document.getElementById('users').textContent = JSON.stringify(loadedUsers, null, 2);
+        document.getElementById('more').disabled = (nextAfterId === null);
       }
       async function addUser(e){
         e.preventDefault();
@@ -176,21 +907,319 @@ HTML_PAGE = """
 def index():
     return HTML_PAGE
 
+@app.route('/pool', methods=['GET'])
+def pool_stats():
+    return jsonify(get_pool().snapshot())
 
 
-@app.route('/users', methods=['GET'])
-def get_users():
+# Read cache settings
+CACHE_ENABLED = os.environ.get("USER_CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 1024))
+CACHE_MAX_BYTES = int(os.environ.get("USER_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+# How often (seconds) a worker re-reads MAX(mysqli_logs.log_id). This bounds
+# how long a write made by another process can go unnoticed.
+CACHE_HWM_CHECK_INTERVAL = float(os.environ.get("USER_CACHE_HWM_INTERVAL", 0.5))
+# Log ids below MAX(log_id) that are still re-counted on every check, to catch
+# transactions that commit a lower auto-increment id after a higher one.
+CACHE_HWM_WINDOW = int(os.environ.get("USER_CACHE_HWM_WINDOW", 10_000))
+
+
+class ReadCache:
+    """LRU + TTL cache of serialized responses, bounded by entries and bytes.
+
+    Every entry remembers the mysqli_logs high-water mark it was built at.
+    The after_user_* triggers append to mysqli_logs on every write, so an
+    entry whose mark differs from the current one is stale, no matter
+    which process or client made the change. A write whose log row commits
+    more than CACHE_HWM_WINDOW ids below the mark is not seen; the TTL
+    bounds how long such an entry can be served.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (hwm, stored_at, status, body)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evictions": 0}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[3])
+
+    def get(self, key, hwm):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] != hwm:
+                self.stats["stale"] += 1
+                self._remove(key)
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                self.stats["expired"] += 1
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[2], entry[3]
+
+    def put(self, key, hwm, status, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (hwm, time.monotonic(), status, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data["entries"] = len(self._entries)
+            data["bytes"] = self._bytes
+        lookups = data["hits"] + data["misses"] + data["stale"] + data["expired"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else None
+        data["high_water_mark"] = _hwm["value"]
+        return data
+
+
+read_cache = ReadCache()
+_hwm = {"value": None, "checked_at": 0.0}
+_hwm_lock = threading.Lock()
+
+
+def current_log_hwm():
+    """mysqli_logs high-water mark as "<MAX(log_id)>-<rows in the last CACHE_HWM_WINDOW ids>",
+    re-read at most every CACHE_HWM_CHECK_INTERVAL.
+
+    MAX(log_id) alone misses a transaction that commits after one holding a
+    higher id; the row count below the maximum still moves when it lands.
+    Returns None if it cannot be read, in which case callers bypass the cache.
+    """
+    now = time.monotonic()
+    if now - _hwm["checked_at"] < CACHE_HWM_CHECK_INTERVAL:
+        return _hwm["value"]
+    with _hwm_lock:
+        if now - _hwm["checked_at"] < CACHE_HWM_CHECK_INTERVAL:
+            return _hwm["value"]
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    """
+                    SELECT COALESCE(MAX(log_id), 0), COUNT(*) FROM mysqli_logs
+                    WHERE log_id > (SELECT COALESCE(MAX(log_id), 0) FROM mysqli_logs) - %s;
+                    """,
+                    (CACHE_HWM_WINDOW,),
+                )
+                max_id, recent = cursor.fetchone()
+                value = f"{max_id}-{recent}"
+            finally:
+                cursor.close()
+                conn.close()
+        except mysql.connector.Error:
+            value = None
+        _hwm["value"] = value
+        _hwm["checked_at"] = time.monotonic()
+        return value
+
+
+def note_local_write():
+    # Our own writes should be visible to our next read straight away
+    _hwm["checked_at"] = 0.0
+
+
+def etag_for(hwm):
+    return None if hwm is None else f"hwm-{hwm}"
+
+
+def not_modified(etag):
+    return etag is not None and etag in request.if_none_match
+
+
+def cached_json(key, build):
+    """Serve `key` from the read cache, or build (status, payload) and cache it."""
+    hwm = current_log_hwm() if CACHE_ENABLED else None
+    etag = etag_for(hwm)
+    if not_modified(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    cached = read_cache.get(key, hwm) if hwm is not None else None
+    if cached is not None:
+        status, body = cached
+    else:
+        status, payload = build()
+        body = timed_dumps(payload).encode()
+        if hwm is not None:
+            read_cache.put(key, hwm, status, body)
+
+    response = Response(body, status=status, mimetype='application/json')
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(read_cache.snapshot())
+
+
+# GET /users paging / streaming settings
+PAGE_SIZE_MAX = 1000
+STREAM_BATCH_SIZE = 500
+
+USERS_AFTER_SQL = "SELECT id, name, email FROM mysqli_users WHERE id > %s ORDER BY id"
+
+
+def parse_page_args(args):
+    after_id = int(args.get('after_id', 0))
+    limit = args.get('limit')
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        limit = min(limit, PAGE_SIZE_MAX)
+    return after_id, limit
+
+
+def user_row_to_dict(row):
+    return {"id": row[0], "name": row[1], "email": row[2]}
+
+
+def get_users_page(after_id, limit):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id, name, email FROM mysqli_users;")
+        # Fetch one extra row to know whether another page exists
+        cursor.execute(USERS_AFTER_SQL + " LIMIT %s;", (after_id, limit + 1))
         rows = cursor.fetchall()
-        return jsonify(rows)
+    finally:
+        cursor.close()
+        conn.close()
+    users = [user_row_to_dict(r) for r in rows[:limit]]
+    next_after_id = users[-1]["id"] if len(rows) > limit else None
+    return {"users": users, "next_after_id": next_after_id}
+
+
+def stream_users(after_id, fmt, limit=None):
+    # Unbuffered cursor: rows are read from the socket batch by batch, so
+    # memory use does not depend on the size of mysqli_users.
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if limit is None:
+            cursor.execute(USERS_AFTER_SQL + ";", (after_id,))
+        else:
+            cursor.execute(USERS_AFTER_SQL + " LIMIT %s;", (after_id, limit))
+    except mysql.connector.Error:
+        cursor.close()
+        conn.close()
+        raise
+
+    route = current_route()
+
+    def generate():
+        finished = False
+        try:
+            if fmt == 'json':
+                yield '['
+            first = True
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                started = time.perf_counter()
+                if fmt == 'ndjson':
+                    chunk = ''.join(json.dumps(user_row_to_dict(r)) + '\n' for r in rows)
+                else:
+                    chunk = ','.join(json.dumps(user_row_to_dict(r)) for r in rows)
+                    chunk = chunk if first else ',' + chunk
+                if METRICS_ENABLED:
+                    observe_phase("serialize", time.perf_counter() - started, route)
+                yield chunk
+                first = False
+            if fmt == 'json':
+                yield ']'
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+                conn.close()
+            else:
+                conn.discard()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    response = Response(generate(), mimetype=mimetype)
+    # If the body is never iterated the generator's finally never runs
+    response.call_on_close(conn.discard)
+    return response
+
+
+@app.route('/users', methods=['GET'])
+def get_users():
+    # ?limit=N[&after_id=M]  -> one keyset page: {"users": [...], "next_after_id": id|null}
+    # no limit               -> the whole table streamed as a JSON array
+    # ?format=ndjson         -> streamed as NDJSON (honours after_id / limit)
+    try:
+        after_id, limit = parse_page_args(request.args)
+    except ValueError:
+        return jsonify({"error": "after_id and limit must be integers, limit > 0"}), 400
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({"error": "format must be json or ndjson"}), 400
+
+    try:
+        if limit is not None and fmt == 'json':
+            return cached_json(('users', after_id, limit), lambda: (200, get_users_page(after_id, limit)))
+
+        hwm = current_log_hwm() if CACHE_ENABLED else None
+        etag = etag_for(hwm)
+        if not_modified(etag):
+            response = Response(status=304)
+        else:
+            response = stream_users(after_id, fmt, limit)
+        if etag is not None:
+            response.set_etag(etag)
+        return response
     except mysql.connector.Error as err:
         return jsonify({"error": str(err)}), 500
+
+
+def get_user_by_email(email):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, name, email FROM mysqli_users WHERE email = %s;", (email,))
+        row = cursor.fetchone()
     finally:
         cursor.close()
         conn.close()
+    if row is None:
+        return 404, {"error": "User not found"}
+    return 200, user_row_to_dict(row)
+
+
+@app.route('/users/by-email/<path:email>', methods=['GET'])
+def get_user_email(email):
+    try:
+        return cached_json(('email', email.lower()), lambda: get_user_by_email(email))
+    except mysql.connector.Error as err:
+        return jsonify({"error": str(err)}), 500
 
 @app.route('/users', methods=['POST'])
 def create_user():
@@ -205,6 +1234,7 @@ def create_user():
     try:
         cursor.execute("INSERT INTO mysqli_users (name, email) VALUES (%s, %s);", (name, email))
         conn.commit()
+        note_local_write()
         user_id = cursor.lastrowid
         return jsonify({"id": user_id, "name": name, "email": email})
     except mysql.connector.Error as err:
@@ -213,6 +1243,178 @@ def create_user():
         cursor.close()
         conn.close()
 
+# POST /users/bulk settings
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_CHUNK_SIZE = 5000
+USER_FIELD_MAX_LEN = 100
+
+
+def iter_bulk_rows(req):
+    # Yields (index, item) pairs; item is an Exception for lines that are not valid JSON.
+    if req.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        index = 0
+        for line in req.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as err:
+                yield index, err
+            index += 1
+    else:
+        data = req.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of {name, email} objects or an NDJSON body")
+        yield from enumerate(data)
+
+
+def validate_bulk_row(item):
+    if isinstance(item, Exception):
+        return f"Invalid JSON: {item}"
+    if not isinstance(item, dict):
+        return "Expected an object with name and email"
+    name, email = item.get('name'), item.get('email')
+    if not isinstance(name, str) or not isinstance(email, str) or not name or not email:
+        return "Missing name or email"
+    if len(name) > USER_FIELD_MAX_LEN or len(email) > USER_FIELD_MAX_LEN:
+        return f"name and email must be at most {USER_FIELD_MAX_LEN} characters"
+    return None
+
+
+def insert_user_chunk(cursor, chunk, results):
+    """Insert a chunk of (index, name, email) rows; returns the number inserted.
+
+    Emails that already exist are reported per row up front, the rest go in
+    as one multi-row INSERT. If that still hits a constraint (a concurrent
+    writer won the race) the chunk is retried row by row so that only the
+    offending rows are reported.
+    """
+    placeholders = ", ".join(["%s"] * len(chunk))
+    cursor.execute(
+        f"SELECT email FROM mysqli_users WHERE email IN ({placeholders});",
+        [email for _, _, email in chunk],
+    )
+    existing = {row[0].lower() for row in cursor.fetchall()}
+
+    pending = []
+    for index, name, email in chunk:
+        if email.lower() in existing:
+            results[index] = {"index": index, "status": "error", "email": email,
+                              "error": "Duplicate entry for email"}
+        else:
+            pending.append((index, name, email))
+    if not pending:
+        return 0
+
+    try:
+        values = ", ".join(["(%s, %s)"] * len(pending))
+        params = [v for _, name, email in pending for v in (name, email)]
+        cursor.execute(f"INSERT INTO mysqli_users (name, email) VALUES {values};", params)
+    except mysql.connector.IntegrityError:
+        inserted = 0
+        for index, name, email in pending:
+            try:
+                cursor.execute("INSERT INTO mysqli_users (name, email) VALUES (%s, %s);", (name, email))
+                results[index] = {"index": index, "status": "inserted", "id": cursor.lastrowid, "email": email}
+                inserted += 1
+            except mysql.connector.IntegrityError as err:
+                results[index] = {"index": index, "status": "error", "email": email, "error": err.msg}
+        return inserted
+
+    # Ids are looked up rather than derived from lastrowid, which is only
+    # contiguous for the whole statement with innodb_autoinc_lock_mode < 2.
+    placeholders = ", ".join(["%s"] * len(pending))
+    cursor.execute(
+        f"SELECT id, email FROM mysqli_users WHERE email IN ({placeholders});",
+        [email for _, _, email in pending],
+    )
+    ids = {row[1].lower(): row[0] for row in cursor.fetchall()}
+    for index, name, email in pending:
+        results[index] = {"index": index, "status": "inserted", "id": ids.get(email.lower()), "email": email}
+    return len(pending)
+
+
+@app.route('/users/bulk', methods=['POST'])
+def create_users_bulk():
+    # Body: JSON array of {name, email}, or NDJSON (Content-Type: application/x-ndjson)
+    # ?mode=best_effort (default) commits every chunk and reports failed rows,
+    # ?mode=atomic inserts everything or nothing.
+    mode = request.args.get('mode', 'best_effort')
+    if mode not in ('best_effort', 'atomic'):
+        return jsonify({"error": "mode must be best_effort or atomic"}), 400
+    try:
+        chunk_size = min(int(request.args.get('chunk_size', BULK_CHUNK_SIZE)), BULK_MAX_CHUNK_SIZE)
+        if chunk_size < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "chunk_size must be a positive integer"}), 400
+
+    started = time.perf_counter()
+    results = {}
+    inserted = 0
+    seen_emails = set()
+    chunk = []
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        def flush():
+            nonlocal inserted
+            if chunk:
+                inserted += insert_user_chunk(cursor, chunk, results)
+                if mode == 'best_effort':
+                    conn.commit()
+                    note_local_write()
+                chunk.clear()
+
+        for index, item in iter_bulk_rows(request):
+            error = validate_bulk_row(item)
+            if error is None and item['email'].lower() in seen_emails:
+                error = "Duplicate email within request"
+            if error is not None:
+                results[index] = {"index": index, "status": "error", "error": error}
+                continue
+            seen_emails.add(item['email'].lower())
+            chunk.append((index, item['name'], item['email']))
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+
+        failed = len(results) - inserted
+        if mode == 'atomic':
+            if failed:
+                conn.rollback()
+                for row in results.values():
+                    if row["status"] == "inserted":
+                        row.update(status="rolled_back", id=None)
+                inserted = 0
+            else:
+                conn.commit()
+                note_local_write()
+    except ValueError as err:
+        conn.rollback()
+        return jsonify({"error": str(err)}), 400
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({"error": str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    body = {
+        "mode": mode,
+        "total": len(results),
+        "inserted": inserted,
+        "failed": failed,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+        "results": [results[i] for i in sorted(results)],
+    }
+    status = 409 if mode == 'atomic' and failed else 200
+    return json_response(body, status)
+
 @app.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     conn = get_db_connection()
@@ -220,6 +1422,7 @@ def delete_user(user_id):
     try:
         cursor.execute("DELETE FROM mysqli_users WHERE id = %s;", (user_id,))
         conn.commit()
+        note_local_write()
         if cursor.rowcount == 0:
             return jsonify({"error": "User not found"}), 404
         return jsonify({"deleted_id": user_id})
@@ -229,13 +1432,159 @@ def delete_user(user_id):
         cursor.close()
         conn.close()
 
-def run_app():
-    # Ensure base tables exist before starting the server
-    ensure_users_table()
-    setup_logging_and_triggers()
-    add_email_index()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+HISTORY_LIMIT_MAX = 500
+
+
+@app.route('/users/<int:user_id>/history', methods=['GET'])
+def get_user_history(user_id):
+    # Newest first; pass the last log_id back as ?before_id= for the next page
+    try:
+        limit = int(request.args.get('limit', 50))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        limit = min(limit, HISTORY_LIMIT_MAX)
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id is not None else None
+    except ValueError:
+        return jsonify({"error": "limit and before_id must be integers, limit > 0"}), 400
+
+    sql = "SELECT log_id, action_type, action_time FROM mysqli_logs WHERE user_id = %s"
+    params = [user_id]
+    if before_id is not None:
+        sql += " AND log_id < %s"
+        params.append(before_id)
+    sql += " ORDER BY log_id DESC LIMIT %s;"
+    params.append(limit)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    except mysql.connector.Error as err:
+        return jsonify({"error": str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+    history = [{"log_id": r[0], "action_type": r[1], "action_time": r[2].isoformat()} for r in rows]
+    next_before_id = history[-1]["log_id"] if len(history) == limit else None
+    return json_response({"user_id": user_id, "history": history, "next_before_id": next_before_id})
+
+
+@app.route('/audit/summary', methods=['GET'])
+def audit_summary():
+    # Per-day / per-action counts for today and the days - 1 before it:
+    # rolled-up days from mysqli_logs_daily plus the not yet rolled-up tail
+    # of mysqli_logs, which is small. Both use the same first day.
+    try:
+        days = int(request.args.get('days', 7))
+        if days < 1:
+            raise ValueError("days must be positive")
+    except ValueError:
+        return jsonify({"error": "days must be an integer > 0"}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT last_log_id FROM mysqli_logs_rollup_state WHERE id = 1;")
+        row = cursor.fetchone()
+        last_log_id = row[0] if row else 0
+        cursor.execute(
+            """
+            SELECT day, action_type, actions FROM mysqli_logs_daily
+            WHERE day >= CURDATE() - INTERVAL %s DAY
+            UNION ALL
+            SELECT DATE(action_time), action_type, COUNT(*) FROM mysqli_logs
+            WHERE log_id > %s AND action_time >= CURDATE() - INTERVAL %s DAY
+            GROUP BY DATE(action_time), action_type;
+            """,
+            (days - 1, last_log_id, days - 1),
+        )
+        rows = cursor.fetchall()
+    except mysql.connector.Error as err:
+        return jsonify({"error": str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+    per_day = {}
+    totals = {"INSERT": 0, "UPDATE": 0, "DELETE": 0}
+    for day, action, count in rows:
+        entry = per_day.setdefault(day.isoformat(), {"day": day.isoformat(), "INSERT": 0, "UPDATE": 0, "DELETE": 0})
+        entry[action] += int(count)
+        totals[action] += int(count)
+    return json_response({
+        "days": [per_day[d] for d in sorted(per_day)],
+        "totals": totals,
+        "rolled_up_to_log_id": last_log_id,
+    })
+
+def serve_production(host, port, workers, threads):
+    # workers > 1: gunicorn pre-fork workers (Unix only), each with `threads`
+    # threads and its own connection pool. Otherwise a waitress thread pool.
+    if workers > 1:
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            print("gunicorn is not installed (it does not run on Windows); using one waitress process.")
+            workers = 1
+
+    if workers > 1:
+        class ProductionApp(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"{host}:{port}")
+                self.cfg.set("workers", workers)
+                self.cfg.set("threads", threads)
+                self.cfg.set("worker_class", "gthread")
+
+            def load(self):
+                return app
+
+        print(f"Serving with gunicorn: {workers} workers x {threads} threads on {host}:{port}")
+        ProductionApp().run()
+    else:
+        from waitress import serve
+        print(f"Serving with waitress: {threads} threads on {host}:{port}")
+        serve(app, host=host, port=port, threads=threads)
+
+
+def run_app(production=False, host='0.0.0.0', port=5000, workers=1, threads=POOL_SIZE, skip_migrate=False):
+    # Bring the schema up to date once, before any worker starts
+    if not skip_migrate:
+        migrate()
+    if production:
+        serve_production(host, port, workers, threads)
+    else:
+        app.run(host=host, port=port, debug=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="task1 user API")
+    sub = parser.add_subparsers(dest="command")
+    p_serve = sub.add_parser("serve", help="migrate the schema and run the API (default)")
+    p_serve.add_argument("--production", action="store_true", default=os.environ.get("APP_ENV") == "production",
+                         help="serve with waitress/gunicorn instead of the Flask debug server")
+    p_serve.add_argument("--host", default="0.0.0.0")
+    p_serve.add_argument("--port", type=int, default=5000)
+    p_serve.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", 1)),
+                         help="worker processes (gunicorn, Unix only)")
+    p_serve.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", POOL_SIZE)),
+                         help="threads per worker; keep <= DB_POOL_SIZE")
+    p_serve.add_argument("--skip-migrate", action="store_true")
+    sub.add_parser("migrate", help="apply pending schema migrations and exit")
+    p_logs = sub.add_parser("maintain-logs", help="roll up, add and purge mysqli_logs partitions")
+    p_logs.add_argument("--retention-days", type=int, default=LOG_RETENTION_DAYS)
+    p_logs.add_argument("--archive", action="store_true", default=LOG_ARCHIVE,
+                        help="copy expired rows to mysqli_logs_archive before dropping them")
+    args = parser.parse_args()
+
+    if args.command == "maintain-logs":
+        run_log_maintenance(args.retention_days, args.archive)
+    elif args.command == "migrate":
+        migrate()
+    elif args.command == "serve":
+        run_app(args.production, args.host, args.port, args.workers, args.threads, args.skip_migrate)
+    else:
+        run_app()
 
 if __name__ == '__main__':
-    # Run in a separate thread if you want to invoke setup without blocking
-    run_app()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Run the task1 tests against a scratch database on the MariaDB server in
+app.main.DB_CONFIG (TEST_DATABASE, default python_db_test). It is created for
+the session and dropped afterwards; without a reachable server the tests skip.
+"""
+import os
+import sys
+
+import pytest
+
+TASK1_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE = os.environ.get("TEST_DATABASE", "python_db_test")
+sys.path.insert(0, TASK1_DIR)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """DB_CONFIG pointing at the scratch database"""
+    mysql_connector = pytest.importorskip("mysql.connector")
+    from app import main
+
+    server_config = {key: value for key, value in main.DB_CONFIG.items() if key != "database"}
+    try:
+        server = mysql_connector.connect(**server_config)
+    except mysql_connector.Error as e:
+        pytest.skip(f"MariaDB not reachable: {e}")
+    cursor = server.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{TEST_DATABASE}`;")
+    config = dict(main.DB_CONFIG, database=TEST_DATABASE)
+    try:
+        yield config
+    finally:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{TEST_DATABASE}`;")
+        server.close()
+
+
+@pytest.fixture
+def connection(database):
+    import mysql.connector
+
+    conn = mysql.connector.connect(**database)
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,21 @@
+import pytest
+
+from app import main
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+@pytest.mark.parametrize("days", ["0", "-3", "x", "1.5"])
+def test_audit_summary_rejects_days_below_one_or_not_integers(client, days):
+    response = client.get(f"/audit/summary?days={days}")
+    assert response.status_code == 400
+    assert "days" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "x"])
+def test_user_history_rejects_limits_below_one_or_not_integers(client, limit):
+    response = client.get(f"/users/1/history?limit={limit}")
+    assert response.status_code == 400
@@ -0,0 +1,38 @@
+import pytest
+
+from app import main
+
+
+@pytest.fixture
+def unpartitioned_logs(connection):
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS mysqli_logs, mysqli_logs_archive;")
+    cursor.execute(main.LOGGING_SETUP_STATEMENTS[0])
+    cursor.execute("CREATE INDEX idx_logs_time ON mysqli_logs (action_time);")
+    yield cursor
+    cursor.execute("DROP TABLE IF EXISTS mysqli_logs, mysqli_logs_archive;")
+    cursor.close()
+
+
+def test_fallback_purge_archives_rows_sharing_one_timestamp(connection, unpartitioned_logs, monkeypatch):
+    cursor = unpartitioned_logs
+    monkeypatch.setattr(main, "LOG_DELETE_BATCH", 10)
+    # 95 expired rows with the same action_time (ties in any ORDER BY action_time), 5 current ones
+    cursor.executemany(
+        "INSERT INTO mysqli_logs (user_id, action_type, action_time) VALUES (%s, 'INSERT', %s);",
+        [(i, "2000-01-01 00:00:00") for i in range(95)],
+    )
+    cursor.executemany(
+        "INSERT INTO mysqli_logs (user_id, action_type) VALUES (%s, 'UPDATE');", [(i,) for i in range(5)]
+    )
+    connection.commit()
+    cursor.execute("SELECT log_id FROM mysqli_logs WHERE action_time < '2001-01-01';")
+    expired = {row[0] for row in cursor.fetchall()}
+
+    result = main.purge_old_logs(cursor, connection, retention_days=30, archive=True)
+
+    assert result == {"deleted_rows": 95}
+    cursor.execute("SELECT log_id FROM mysqli_logs_archive;")
+    assert {row[0] for row in cursor.fetchall()} == expired
+    cursor.execute("SELECT COUNT(*), MIN(action_type) FROM mysqli_logs;")
+    assert cursor.fetchone() == (5, "UPDATE")
@@ -1,7 +1,47 @@
+import argparse
+import sys
+
 from .main import main
 
 print('__main__ file')
 
+
+def cli():
+    parser = argparse.ArgumentParser(prog="python -m app")
+    sub = parser.add_subparsers(dest="command")
+
+    p_import = sub.add_parser("import", help="bulk import users and addresses from CSV/NDJSON")
+    p_import.add_argument("file")
+    p_import.add_argument("--format", choices=["csv", "ndjson"])
+    p_import.add_argument("--chunk-size", type=int, default=1000)
+    p_import.add_argument("--atomic", action="store_true",
+                          help="one transaction for the whole file (no checkpoints)")
+    p_import.add_argument("--on-conflict", choices=["skip", "fail"], default="skip",
+                          help="what to do with emails that already exist")
+    p_import.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+
+    p_export = sub.add_parser("export", help="export users and addresses to CSV/NDJSON")
+    p_export.add_argument("file")
+    p_export.add_argument("--format", choices=["csv", "ndjson"])
+    p_export.add_argument("--chunk-size", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command is None:
+        main()
+        return
+
+    from .transfer import TransferError, export_users, import_users
+    from sqlalchemy.exc import SQLAlchemyError
+    try:
+        if args.command == "import":
+            import_users(args.file, args.format, args.chunk_size, args.atomic, args.on_conflict,
+                         resume=not args.restart)
+        else:
+            export_users(args.file, args.format, args.chunk_size)
+    except (TransferError, SQLAlchemyError, OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
 if __name__ == '__main__':
-    main()
-    
\ No newline at end of file
+    cli()
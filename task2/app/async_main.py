@@ -0,0 +1,134 @@
+"""Asyncio version of the task2 data layer.
+
+    python -m app.async_main                    # same demo as python -m app
+    DB_PROFILE=sqlite python -m app.async_main  # aiosqlite, no server needed
+
+Uses the models from app.main with an AsyncEngine (aiomysql or aiosqlite).
+Audit logging works unchanged: an AsyncSession runs a regular Session
+underneath, so the mapper and Session listeners in app.main fire as usual.
+Implicit lazy loads cannot run under asyncio, so every query states how
+relationships are loaded and anything not loaded raises instead of doing IO.
+"""
+import asyncio
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import raiseload, selectinload
+
+from .main import (Base, User, Address, LogsUser, DB_CONFIG, DB_PROFILE, SQLITE_PATH, POOL_SETTINGS, SQL_ECHO,
+                   REPORT_BATCH_SIZE, configure_sqlite_connection, users_with_addresses_query)
+
+if DB_PROFILE == "sqlite":
+    ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_PATH}"
+else:
+    ASYNC_DATABASE_URL = f"mysql+aiomysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+
+# Users with their address list; any other relationship access raises
+WITH_ADDRESSES = (selectinload(User.addresses).raiseload("*"), raiseload("*"))
+
+
+def make_async_engine(url=ASYNC_DATABASE_URL, echo=SQL_ECHO, **pool_settings):
+    """AsyncEngine for `url` with the same POOL_SETTINGS as the sync engine"""
+    settings = {**POOL_SETTINGS, **pool_settings}
+    if url.startswith("sqlite"):
+        new_engine = create_async_engine(url, echo=echo, connect_args={"timeout": 30}, **settings)
+        event.listen(new_engine.sync_engine, "connect", configure_sqlite_connection)
+        return new_engine
+    return create_async_engine(url, echo=echo, **settings)
+
+
+async_engine = make_async_engine()
+# expire_on_commit=False: attributes stay readable after commit without an implicit refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def create_tables():
+    """Create all tables if they don't exist"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def get_user_by_email(db, email):
+    """User with addresses loaded, or None"""
+    result = await db.execute(select(User).options(*WITH_ADDRESSES).where(User.email == email))
+    return result.scalar_one_or_none()
+
+
+async def iter_users_with_addresses(db, city=None, email_domain=None, batch_size=REPORT_BATCH_SIZE):
+    """Async counterpart of app.main.iter_users_with_addresses (two statements per window)"""
+    query = users_with_addresses_query(city, email_domain, batch_size).options(raiseload("*"))
+    last_id = 0
+    while True:
+        users = (await db.execute(query.where(User.id > last_id))).scalars().all()
+        for user in users:
+            yield user
+        if len(users) < batch_size:
+            break
+        last_id = users[-1].id
+
+
+async def insert_users_with_transaction():
+    """Insert the demo users in one transaction"""
+    print("\n=== ASYNC: TRANSACTION HANDLING ===")
+    async with AsyncSessionLocal() as db:
+        try:
+            async with db.begin():
+                db.add_all([
+                    User(name="Alice Smith", email="alice@example.com"),
+                    User(name="Bob Johnson", email="bob@example.com"),
+                    User(name="Charlie Brown", email="charlie@example.com"),
+                ])
+            print("Transaction committed: 3 users added successfully!")
+        except SQLAlchemyError as e:
+            print(f"Transaction rolled back due to error: {e}")
+
+
+async def demonstrate_relationships():
+    """Add addresses to Alice, print Bob's and list everyone"""
+    print("\n=== ASYNC: USER-ADDRESS RELATIONSHIPS ===")
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            alice = await get_user_by_email(db, "alice@example.com")
+            if alice:
+                # The collection was loaded by WITH_ADDRESSES, so appending does no IO
+                alice.addresses.extend([Address(street="123 Main St", city="New York"),
+                                        Address(street="456 Oak Ave", city="Boston")])
+                print("Added addresses to Alice")
+
+        bob = await get_user_by_email(db, "bob@example.com")
+        if bob:
+            print(f"Bob's addresses: {[addr.city for addr in bob.addresses]}")
+
+        print("\n=== USERS AND ADDRESSES ===")
+        async for user in iter_users_with_addresses(db):
+            print(f"User: {user.name} ({user.email})")
+            for addr in user.addresses:
+                print(f"  Address: {addr.street}, {addr.city}")
+            if not user.addresses:
+                print("  No addresses")
+
+
+async def print_logs():
+    """Print recent log entries"""
+    async with AsyncSessionLocal() as db:
+        logs = (await db.execute(select(LogsUser).order_by(LogsUser.timestamp.desc()).limit(10))).scalars()
+        print("\n=== RECENT LOGS ===")
+        for log in logs:
+            print(f"Log: user_id={log.user_id}, action={log.action}, time={log.timestamp}")
+
+
+async def main():
+    print("SQLAlchemy asyncio application starting...")
+    print(f"Database: {async_engine.url.render_as_string(hide_password=True)}")
+    try:
+        await create_tables()
+        await insert_users_with_transaction()
+        await demonstrate_relationships()
+        await print_logs()
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
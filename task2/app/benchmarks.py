@@ -0,0 +1,424 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+
+from . import main as app_main
+from .main import (engine, SessionLocal, POOL_SETTINGS, User, Address, LogsUser, create_tables,
+                   create_missing_indexes, session_scope)
+
+
+class StatementCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.bind, "before_cursor_execute", self._on_execute)
+
+
+def cleanup_users(prefix):
+    """Remove benchmark users, their addresses and their log rows"""
+    with engine.begin() as conn:
+        ids = list(conn.execute(select(User.id).where(User.email.like(prefix + "%"))).scalars())
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            conn.execute(delete(Address).where(Address.user_id.in_(chunk)))
+            conn.execute(delete(User).where(User.id.in_(chunk)))
+            conn.execute(delete(LogsUser).where(LogsUser.user_id.in_(chunk)))  # after the DELETE is logged
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of `samples` (seconds) in milliseconds"""
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        rank = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        result[f"p{p}_ms"] = round(ordered[rank] * 1000, 3)
+    return result
+
+
+def seed_users(prefix, domain, users, addresses_per_user, cities=("Warsaw", "Krakow", "Gdansk")):
+    """Insert users with addresses through Core, bypassing the unit of work"""
+    with engine.begin() as conn:
+        for start in range(0, users, 1000):
+            rows = [{"name": f"Bench {i}", "email": f"{prefix}{i}@{domain}"}
+                    for i in range(start, min(start + 1000, users))]
+            conn.execute(insert(User), rows)
+            ids = conn.execute(select(User.id).where(User.email.in_([r["email"] for r in rows]))).scalars()
+            conn.execute(insert(Address), [
+                {"user_id": user_id, "street": f"{n} Bench St", "city": cities[(user_id + n) % len(cities)]}
+                for user_id in ids for n in range(addresses_per_user)
+            ])
+
+
+def bench_audit_flush(users):
+    """Flush + commit time for inserting `users` users, per audit mode"""
+    create_tables()
+    report = {}
+    previous_mode = app_main.AUDIT_MODE
+    try:
+        for mode in ("per_row", "batched"):
+            app_main.AUDIT_MODE = mode
+            prefix = f"audit-{uuid.uuid4().hex[:8]}-"
+            session = SessionLocal()
+            session.add_all(User(name=f"Bench {i}", email=f"{prefix}{i}@bench.example") for i in range(users))
+            with StatementCounter(engine) as counter:
+                started = time.perf_counter()
+                session.commit()
+                elapsed = time.perf_counter() - started
+            logged = session.query(LogsUser).join(User, User.id == LogsUser.user_id) \
+                .filter(User.email.like(prefix + "%")).count()
+            session.close()
+            cleanup_users(prefix)
+            report[mode] = {
+                "users": users,
+                "log_rows_written": logged,
+                "statements": counter.count,
+                "seconds": round(elapsed, 3),
+            }
+            print(f"{mode}: {report[mode]}")
+    finally:
+        app_main.AUDIT_MODE = previous_mode
+    return report
+
+
+class SessionOwnership:
+    """Counts sessions that begin transactions from more than one thread"""
+
+    def __init__(self):
+        self.shared = 0
+
+    def _on_begin(self, session, transaction, connection):
+        owner = session.info.setdefault("bench_thread", threading.get_ident())
+        if owner != threading.get_ident():
+            self.shared += 1
+
+    def __enter__(self):
+        event.listen(Session, "after_begin", self._on_begin)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Session, "after_begin", self._on_begin)
+
+
+def lookup_or_update(rng, emails, write_ratio):
+    """One unit of work: load a user with addresses, sometimes rename it"""
+    with session_scope() as db:
+        user = db.execute(
+            select(User).options(selectinload(User.addresses)).where(User.email == rng.choice(emails))
+        ).scalar_one()
+        if rng.random() < write_ratio:
+            user.name = f"Bench {rng.getrandbits(32):x}"
+
+
+def bench_concurrency(thread_counts, seconds, users, write_ratio):
+    """Units of work per second with 1..N threads, each unit on its own session"""
+    create_tables()
+    prefix = f"conc-{uuid.uuid4().hex[:8]}-"
+    seed_users(prefix, "bench.example", users, addresses_per_user=2)
+    emails = [f"{prefix}{i}@bench.example" for i in range(users)]
+    report = {"pool": engine.pool.status(), "write_ratio": write_ratio, "runs": {}}
+
+    def worker(seed, deadline):
+        rng = random.Random(seed)
+        done = 0
+        while time.perf_counter() < deadline:
+            lookup_or_update(rng, emails, write_ratio)
+            done += 1
+        return done
+
+    try:
+        for threads in thread_counts:
+            with SessionOwnership() as ownership, ThreadPoolExecutor(max_workers=threads) as pool:
+                started = time.perf_counter()
+                futures = [pool.submit(worker, n, started + seconds) for n in range(threads)]
+                ops = sum(f.result() for f in futures)
+                elapsed = time.perf_counter() - started
+            assert ownership.shared == 0, f"{ownership.shared} sessions were used from more than one thread"
+            run = {"ops": ops, "ops_per_sec": round(ops / elapsed, 1)}
+            base = report["runs"].get(thread_counts[0])
+            if base:
+                run["speedup"] = round(run["ops_per_sec"] / base["ops_per_sec"], 2)
+            report["runs"][threads] = run
+            print(f"{threads} threads: {run}")
+    finally:
+        cleanup_users(prefix)
+    report["pool_after"] = engine.pool.status()
+    return report
+
+
+def bench_user_cache(users, lookups, hot_users):
+    """Latency of repeated lookups by email, uncached vs through the user cache"""
+    from . import cache
+
+    prefix = f"cache-{uuid.uuid4().hex[:8]}-"
+    seed_users(prefix, "bench.example", users, addresses_per_user=2)
+    rng = random.Random(42)
+    # Repeated lookups of a hot set, like the demo's lookups of the same users
+    emails = [f"{prefix}{rng.randrange(min(hot_users, users))}@bench.example" for _ in range(lookups)]
+    report = {"users": users, "lookups": lookups, "hot_users": hot_users}
+    previous = cache.USER_CACHE_ENABLED
+    try:
+        for label, enabled in (("uncached", False), ("cached", True)):
+            cache.USER_CACHE_ENABLED = enabled
+            cache.user_cache = cache.UserCache(cache.USER_CACHE_SIZE)
+            samples = []
+            with StatementCounter(engine) as counter:
+                for email in emails:
+                    started = time.perf_counter()
+                    with session_scope() as db:  # a new session each time: cold identity map
+                        cache.get_user(db, email=email)
+                    samples.append(time.perf_counter() - started)
+            report[label] = {**percentiles(samples), "statements": counter.count,
+                             "lookups_per_sec": round(len(samples) / sum(samples), 1)}
+            if enabled:
+                report[label]["cache"] = cache.user_cache.snapshot()
+            print(f"{label}: {report[label]}")
+
+        # An update must evict the entry; the next lookup reads the new name
+        with session_scope() as db:
+            db.execute(select(User).where(User.email == emails[0])).scalar_one().name = "Renamed"
+        with session_scope() as db:
+            assert cache.get_user(db, email=emails[0])["name"] == "Renamed", "stale cache entry after update"
+        report["invalidation_check"] = "ok"
+    finally:
+        cache.USER_CACHE_ENABLED = previous
+        cleanup_users(prefix)
+        cache.user_cache.clear()  # cleanup bypasses the mapper events
+    return report
+
+
+def bench_async_lookups(users, lookups, threads):
+    """`lookups` concurrent lookups by email: asyncio mode vs the sync code on a thread pool"""
+    from . import async_main
+
+    create_tables()
+    prefix = f"async-{uuid.uuid4().hex[:8]}-"
+    seed_users(prefix, "bench.example", users, addresses_per_user=2)
+    rng = random.Random(7)
+    emails = [f"{prefix}{rng.randrange(users)}@bench.example" for _ in range(lookups)]
+    report = {"lookups": lookups, "pool": POOL_SETTINGS}
+
+    def sync_lookup(email):
+        started = time.perf_counter()
+        with session_scope() as db:
+            user = db.execute(
+                select(User).options(selectinload(User.addresses)).where(User.email == email)
+            ).scalar_one()
+            assert len(user.addresses) == 2
+        return time.perf_counter() - started
+
+    async def async_lookup(email):
+        started = time.perf_counter()
+        async with async_main.AsyncSessionLocal() as db:
+            user = await async_main.get_user_by_email(db, email)
+            assert len(user.addresses) == 2
+        return time.perf_counter() - started
+
+    async def run_async():
+        try:
+            return await asyncio.gather(*(async_lookup(email) for email in emails))
+        finally:
+            await async_main.async_engine.dispose()
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(sync_lookup, emails))
+        elapsed = time.perf_counter() - started
+        report[f"threads_{threads}"] = {**percentiles(samples), "seconds": round(elapsed, 3),
+                                        "lookups_per_sec": round(lookups / elapsed, 1)}
+
+        started = time.perf_counter()
+        samples = asyncio.run(run_async())
+        elapsed = time.perf_counter() - started
+        report["asyncio"] = {**percentiles(samples), "seconds": round(elapsed, 3),
+                             "lookups_per_sec": round(lookups / elapsed, 1)}
+    finally:
+        cleanup_users(prefix)
+    for label in (f"threads_{threads}", "asyncio"):
+        if label in report:
+            print(f"{label}: {report[label]}")
+    return report
+
+
+# The index plan declared on the models
+PLANNED_INDEXES = [index for table in (Address.__table__, LogsUser.__table__)
+                   for index in sorted(table.indexes, key=lambda ix: ix.name)]
+
+
+def seed_logs(user_ids, logs_per_user):
+    """Audit rows spread over the last 30 days, inserted through Core"""
+    rng = random.Random(3)
+    now = datetime.now()
+    rows = [{"user_id": user_id, "action": rng.choice(("INSERT", "UPDATE", "DELETE")),
+             "timestamp": now - timedelta(seconds=rng.randrange(30 * 86400))}
+            for user_id in user_ids for _ in range(logs_per_user)]
+    with engine.begin() as conn:
+        for start in range(0, len(rows), 5000):
+            conn.execute(insert(LogsUser), rows[start:start + 5000])
+
+
+def time_query(samples, statement, params=None):
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        conn.execute(statement, params or {}).all()
+        samples.append(time.perf_counter() - started)
+
+
+def run_index_workload(ids, emails, repeat, delete_ids, write_rows):
+    """Latency percentiles of the queries the app issues, plus write throughput"""
+    rng = random.Random(11)
+    queries = {
+        "recent_logs": lambda: select(LogsUser).order_by(LogsUser.timestamp.desc()).limit(10),
+        "user_history": lambda: select(LogsUser).where(LogsUser.user_id == rng.choice(ids))
+                        .order_by(LogsUser.timestamp.desc()).limit(20),
+        "user_addresses": lambda: select(Address).where(Address.user_id == rng.choice(ids)),
+        "lookup_by_email": lambda: select(User).where(User.email == rng.choice(emails)),
+    }
+    result = {}
+    for name, build in queries.items():
+        samples = []
+        for _ in range(repeat):
+            time_query(samples, build())
+        result[name] = percentiles(samples)
+
+    # ORM delete of a user with its addresses (cascade) and its audit row
+    samples = []
+    for user_id in delete_ids:
+        started = time.perf_counter()
+        with session_scope() as db:
+            db.delete(db.get(User, user_id))
+        samples.append(time.perf_counter() - started)
+    result["delete_user"] = percentiles(samples) if samples else None
+
+    # Writes pay for every index: audit rows and addresses, in multi-row INSERTs
+    log_rows = [{"user_id": rng.choice(ids), "action": "UPDATE"} for _ in range(write_rows)]
+    address_rows = [{"user_id": rng.choice(ids), "street": "1 Write St", "city": "Bench"} for _ in range(write_rows)]
+    for label, model, rows in (("log_inserts", LogsUser, log_rows), ("address_inserts", Address, address_rows)):
+        with engine.begin() as conn:
+            started = time.perf_counter()
+            for start in range(0, len(rows), 1000):
+                conn.execute(insert(model), rows[start:start + 1000])
+            elapsed = time.perf_counter() - started
+        result[label] = {"rows_per_sec": round(len(rows) / elapsed, 1)}
+    return result
+
+
+def drop_indexes(indexes):
+    """Drop the given model indexes; returns {name: reason} for the ones that could not be dropped"""
+    skipped = {}
+    for index in indexes:
+        try:
+            index.drop(engine)
+        except SQLAlchemyError as e:
+            # e.g. missing (covered by an existing index) or needed by a foreign key
+            skipped[index.name] = str(e.orig if getattr(e, "orig", None) else e).splitlines()[0]
+    return skipped
+
+
+def bench_indexes(users, addresses_per_user, logs_per_user, repeat, deletes_per_run, write_rows):
+    """Run the workload with all planned indexes, without each one, and without any"""
+    create_tables()
+    prefix = f"idx-{uuid.uuid4().hex[:8]}-"
+    runs = 2 + len(PLANNED_INDEXES)
+    seed_users(prefix, "bench.example", users + runs * deletes_per_run, addresses_per_user)
+    with engine.connect() as conn:
+        rows = conn.execute(select(User.id, User.email).where(User.email.like(prefix + "%")).order_by(User.id)).all()
+    seed_logs([row.id for row in rows], logs_per_user)
+    # The first ids are deleted during the runs, the rest are looked up
+    delete_ids, lookup_rows = [row.id for row in rows[:runs * deletes_per_run]], rows[runs * deletes_per_run:]
+    ids, emails = [row.id for row in lookup_rows], [row.email for row in lookup_rows]
+
+    report = {"users": users, "addresses_per_user": addresses_per_user, "logs_per_user": logs_per_user,
+              "repeat": repeat, "runs": {}}
+    scenarios = [("all_indexes", [])] + [(f"without_{ix.name}", [ix]) for ix in PLANNED_INDEXES] \
+        + [("no_indexes", PLANNED_INDEXES)]
+    try:
+        for n, (label, dropped) in enumerate(scenarios):
+            create_missing_indexes()
+            skipped = drop_indexes(dropped)
+            run = run_index_workload(ids, emails, repeat, delete_ids[n * deletes_per_run:(n + 1) * deletes_per_run],
+                                     write_rows)
+            if skipped:
+                run["not_dropped"] = skipped
+            report["runs"][label] = run
+            print(f"{label}: {json.dumps(run)}")
+    finally:
+        create_missing_indexes()
+        cleanup_users(prefix)
+        with engine.begin() as conn:  # audit rows of the users deleted during the runs
+            conn.execute(delete(LogsUser).where(LogsUser.user_id.in_(delete_ids)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="task2 benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_audit = sub.add_parser("audit", help="flush time with per-row vs batched audit logging")
+    p_audit.add_argument("--users", type=int, default=10_000)
+
+    p_conc = sub.add_parser("concurrency", help="throughput of concurrent units of work (session per unit of work)")
+    p_conc.add_argument("--threads", default="1,2,4,8", help="comma-separated thread counts")
+    p_conc.add_argument("--seconds", type=float, default=5.0, help="run time per thread count")
+    p_conc.add_argument("--users", type=int, default=1000)
+    p_conc.add_argument("--write-ratio", type=float, default=0.1, help="share of units of work that update the user")
+
+    p_cache = sub.add_parser("user-cache", help="repeated lookups by email with and without the user cache")
+    p_cache.add_argument("--users", type=int, default=1000)
+    p_cache.add_argument("--lookups", type=int, default=5000)
+    p_cache.add_argument("--hot-users", type=int, default=100, help="lookups pick from the first N users")
+
+    p_async = sub.add_parser("async-lookups", help="concurrent lookups: asyncio mode vs a thread pool of sync code")
+    p_async.add_argument("--users", type=int, default=1000)
+    p_async.add_argument("--lookups", type=int, default=1000)
+    p_async.add_argument("--threads", type=int, default=16)
+
+    p_idx = sub.add_parser("indexes", help="app queries and write throughput with and without each planned index")
+    p_idx.add_argument("--users", type=int, default=10_000)
+    p_idx.add_argument("--addresses-per-user", type=int, default=2)
+    p_idx.add_argument("--logs-per-user", type=int, default=20)
+    p_idx.add_argument("--repeat", type=int, default=200, help="executions per query and scenario")
+    p_idx.add_argument("--deletes", type=int, default=20, help="user deletions per scenario")
+    p_idx.add_argument("--write-rows", type=int, default=5000, help="rows per write-throughput test")
+
+    args = parser.parse_args()
+    engine.echo = False
+    if args.command == "audit":
+        report = bench_audit_flush(args.users)
+    elif args.command == "concurrency":
+        thread_counts = [int(t) for t in args.threads.split(",")]
+        report = bench_concurrency(thread_counts, args.seconds, args.users, args.write_ratio)
+    elif args.command == "user-cache":
+        report = bench_user_cache(args.users, args.lookups, args.hot_users)
+    elif args.command == "async-lookups":
+        report = bench_async_lookups(args.users, args.lookups, args.threads)
+    elif args.command == "indexes":
+        report = bench_indexes(args.users, args.addresses_per_user, args.logs_per_user, args.repeat,
+                               args.deletes, args.write_rows)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
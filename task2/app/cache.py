@@ -0,0 +1,213 @@
+"""Opt-in second-level cache of users and their addresses.
+
+    from app.cache import get_user
+    user = get_user(db, email="alice@example.com")   # dict or None
+
+Entries are plain dict snapshots ({"id", "name", "email", "addresses"})
+kept in one bounded LRU per process, shared by all sessions and keyed by id
+and by email. They are never ORM objects, so nothing is attached to a
+session that did not load it. The cache is opt-in: USER_CACHE=1 enables it,
+otherwise get_user always queries. Entries expire USER_CACHE_TTL seconds
+after they were filled, which bounds anything the invalidation below misses.
+
+Invalidation follows the unit of work:
+- User/Address mapper events evict the affected user as soon as a flush
+  writes it, and remember the id on the session.
+- after_commit evicts those ids again, dropping anything another session
+  re-read from the old committed rows between the flush and the commit.
+- after_rollback forgets them; nothing was cached from uncommitted data
+  because sessions with pending or flushed changes never fill the cache.
+- ORM bulk UPDATE/DELETE statements on User/Address clear the whole cache
+  at commit. Core statements run directly on the engine are not seen.
+- Every invalidation bumps a generation. A fill only happens if no
+  invalidation ran since the reading transaction began: under REPEATABLE
+  READ the whole transaction reads one snapshot, so a row read after a
+  concurrent commit can still be the old one.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session, selectinload
+
+from .main import User, Address
+
+USER_CACHE_ENABLED = os.environ.get("USER_CACHE", "0") == "1"
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10_000))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 300))
+
+
+class UserCache:
+    """Thread-safe LRU of user snapshots, reachable by id and by email"""
+
+    def __init__(self, max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_id = OrderedDict()  # user id -> (snapshot, expires at), least recently used first
+        self._ids_by_email = {}
+        # Bumped by every invalidation; a fill that started before an
+        # invalidation may hold old data and is dropped.
+        self.generation = 0
+        self.stats = {"hits": 0, "misses": 0, "fills": 0, "stale_fills": 0,
+                      "invalidations": 0, "evictions": 0, "expired": 0, "clears": 0}
+
+    def get(self, user_id=None, email=None):
+        with self._lock:
+            if user_id is None:
+                user_id = self._ids_by_email.get(email.lower())
+            entry = self._by_id.get(user_id)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(user_id)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            snapshot = entry[0]
+            self._by_id.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return snapshot
+
+    def put(self, snapshot, generation):
+        with self._lock:
+            if generation != self.generation:
+                self.stats["stale_fills"] += 1
+                return
+            self._remove(snapshot["id"])
+            self._by_id[snapshot["id"]] = (snapshot, time.monotonic() + self.ttl)
+            self._ids_by_email[snapshot["email"].lower()] = snapshot["id"]
+            self.stats["fills"] += 1
+            while len(self._by_id) > self.max_entries:
+                _, (evicted, _) = self._by_id.popitem(last=False)
+                self._ids_by_email.pop(evicted["email"].lower(), None)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                if self._remove(user_id):
+                    self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._by_id.clear()
+            self._ids_by_email.clear()
+            self.stats["clears"] += 1
+
+    def _remove(self, user_id):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_email.pop(entry[0]["email"].lower(), None)
+        return entry is not None
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._by_id), max_entries=self.max_entries, ttl=self.ttl)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+user_cache = UserCache()
+
+
+def user_snapshot(user):
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "addresses": [{"id": a.id, "street": a.street, "city": a.city} for a in user.addresses],
+    }
+
+
+def has_uncommitted_changes(db):
+    return bool(db.new or db.dirty or db.deleted or db.info.get("user_cache_dirty")
+                or db.info.get("user_cache_clear"))
+
+
+def get_user(db, user_id=None, email=None):
+    """User snapshot by id or email, from the cache or loaded through `db`"""
+    if (user_id is None) == (email is None):
+        raise ValueError("pass exactly one of user_id or email")
+    if USER_CACHE_ENABLED:
+        snapshot = user_cache.get(user_id=user_id, email=email)
+        if snapshot is not None:
+            return snapshot
+    # The generation as of the start of the transaction that reads the row
+    generation = db.info.get("user_cache_generation", user_cache.generation)
+    query = select(User).options(selectinload(User.addresses))
+    query = query.where(User.id == user_id) if user_id is not None else query.where(User.email == email)
+    user = db.execute(query).scalar_one_or_none()
+    if user is None:
+        return None
+    snapshot = user_snapshot(user)
+    # A session with its own changes may see rows other sessions cannot
+    if USER_CACHE_ENABLED and not has_uncommitted_changes(db):
+        user_cache.put(snapshot, generation)
+    return snapshot
+
+
+def mark_dirty(target_session, user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    user_cache.invalidate(user_ids)
+    if target_session is not None:
+        target_session.info.setdefault("user_cache_dirty", set()).update(user_ids)
+
+
+def evict_user(mapper, connection, target):
+    """Any write to a user row"""
+    mark_dirty(object_session(target), [target.id])
+
+
+def evict_address_owner(mapper, connection, target):
+    """Any write to an address changes its user's address list (old and new owner)"""
+    owners = [target.user_id, *inspect(target).attrs.user_id.history.deleted]
+    mark_dirty(object_session(target), owners)
+
+
+def evict_after_commit(session):
+    if session.info.pop("user_cache_clear", False):
+        user_cache.clear()
+    user_ids = session.info.pop("user_cache_dirty", None)
+    if user_ids:
+        user_cache.invalidate(user_ids)
+
+
+def note_generation(session, transaction, connection):
+    """Fills are checked against the generation from before the transaction's first read"""
+    session.info.setdefault("user_cache_generation", user_cache.generation)
+
+
+def forget_generation(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("user_cache_generation", None)
+
+
+def forget_after_rollback(session):
+    session.info.pop("user_cache_dirty", None)
+    session.info.pop("user_cache_clear", None)
+
+
+def clear_on_bulk_statement(orm_execute_state):
+    """ORM bulk UPDATE/DELETE skip mapper events, so drop everything at commit"""
+    state = orm_execute_state
+    if not (state.is_update or state.is_delete) or state.bind_mapper is None:
+        return
+    if state.bind_mapper.class_ in (User, Address):
+        user_cache.clear()
+        state.session.info["user_cache_clear"] = True
+
+
+for _event in ("after_insert", "after_update", "before_delete"):
+    event.listen(User, _event, evict_user)
+    event.listen(Address, _event, evict_address_owner)
+event.listen(Session, "after_begin", note_generation)
+event.listen(Session, "after_transaction_end", forget_generation)
+event.listen(Session, "after_commit", evict_after_commit)
+event.listen(Session, "after_rollback", forget_after_rollback)
+event.listen(Session, "do_orm_execute", clear_on_bulk_statement)
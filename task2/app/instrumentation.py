@@ -0,0 +1,211 @@
+"""Query instrumentation built on SQLAlchemy engine events.
+
+    with profile(engine, "demonstrate_relationships") as prof:
+        demonstrate_relationships()
+    print(prof.report())
+
+Statements are timed in before/after_cursor_execute, grouped by a
+normalized fingerprint (literals and IN-lists collapsed), counted per
+session, logged when slower than SQL_SLOW_MS, and checked for N+1
+patterns: the same SELECT fingerprint running SQL_N_PLUS_ONE_THRESHOLD
+times inside one session transaction.
+"""
+import contextvars
+import functools
+import logging
+import os
+import re
+import time
+import weakref
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_MS", 100))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", 10))
+
+logger = logging.getLogger("app.sql")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*",
+                          re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+_active_profilers = contextvars.ContextVar("active_profilers", default=())
+_instrumented = weakref.WeakSet()
+
+
+def fingerprint(statement):
+    """Normalize a statement so that executions differing only in values group together"""
+    fp = _STRING.sub("?", statement)
+    fp = _PLACEHOLDER.sub("?", fp)
+    fp = _NUMBER.sub("?", fp)
+    fp = _IN_LIST.sub("IN (?)", fp)
+    fp = _VALUES_LIST.sub(r"VALUES \1", fp)
+    return _SPACES.sub(" ", fp).strip()
+
+
+class QueryProfile:
+    """Statements recorded while a profile() block is active"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.by_fingerprint = {}  # fingerprint -> [count, total seconds, max seconds]
+        self.by_session = {}      # session label -> statement count
+        self.slow_queries = []    # (seconds, statement)
+        self.n_plus_one = []      # (session label, fingerprint, count)
+
+    @property
+    def statements(self):
+        return sum(entry[0] for entry in self.by_fingerprint.values())
+
+    @property
+    def db_time(self):
+        return sum(entry[1] for entry in self.by_fingerprint.values())
+
+    def record(self, fp, seconds, session_label):
+        entry = self.by_fingerprint.get(fp)
+        if entry is None:
+            entry = self.by_fingerprint[fp] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        self.by_session[session_label] = self.by_session.get(session_label, 0) + 1
+
+    def report(self, top=10):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        lines = [
+            f"=== SQL PROFILE: {self.label} ===",
+            f"{self.statements} statements, {self.db_time * 1000:.1f} ms in the database, "
+            f"{elapsed * 1000:.1f} ms total",
+        ]
+        ranked = sorted(self.by_fingerprint.items(), key=lambda item: item[1][1], reverse=True)
+        for fp, (count, total, worst) in ranked[:top]:
+            lines.append(f"  {count:5d}x  total {total * 1000:8.2f} ms  avg {total / count * 1000:7.2f} ms  "
+                         f"max {worst * 1000:7.2f} ms  {fp[:120]}")
+        if self.by_session:
+            lines.append("Statements per session: " +
+                         ", ".join(f"{name}={count}" for name, count in sorted(self.by_session.items())))
+        for seconds, statement in self.slow_queries:
+            lines.append(f"SLOW ({seconds * 1000:.1f} ms): {statement[:200]}")
+        for session_label, fp, count in self.n_plus_one:
+            lines.append(f"N+1 suspect in {session_label}: {count}x {fp[:120]}")
+        return "\n".join(lines)
+
+
+def _session_label(session):
+    label = session.info.get("instrument_label")
+    if label is None:
+        label = session.info["instrument_label"] = f"session-{id(session):x}"
+    return label
+
+
+def _attach_session(session, transaction, connection):
+    # Let the cursor events find the session that owns this connection
+    connection.info["instrument_session"] = weakref.ref(session)
+
+
+def _release_connection(dbapi_connection, connection_record):
+    # Connection.info lives on the pool's connection record, so drop the tag
+    # before the pool hands this connection to another session. By the time
+    # after_transaction_end fires the Connection is already closed.
+    if connection_record is not None:
+        connection_record.info.pop("instrument_session", None)
+
+
+def _detach_session(session, transaction):
+    if transaction.parent is not None:
+        return
+    # A new transaction is a new unit of work for the N+1 detector
+    session.info.pop("instrument_fingerprints", None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("instrument_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["instrument_start"].pop()
+    profilers = _active_profilers.get()
+    is_slow = elapsed * 1000 >= SLOW_QUERY_MS
+    if not profilers and not is_slow:
+        return
+
+    fp = fingerprint(statement)
+    session_ref = conn.info.get("instrument_session")
+    session = session_ref() if session_ref is not None else None
+    session_label = _session_label(session) if session is not None else "no-session"
+
+    if is_slow:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+    suspect = None
+    if session is not None and fp.upper().startswith("SELECT"):
+        counts = session.info.setdefault("instrument_fingerprints", {})
+        counts[fp] = counts.get(fp, 0) + 1
+        if counts[fp] == N_PLUS_ONE_THRESHOLD:
+            suspect = (session_label, fp, counts[fp])
+            logger.warning("Possible N+1: %s ran %d times in one transaction of %s",
+                           fp, counts[fp], session_label)
+
+    for profiler in profilers:
+        profiler.record(fp, elapsed, session_label)
+        if is_slow:
+            profiler.slow_queries.append((elapsed, statement))
+        if suspect:
+            profiler.n_plus_one.append(suspect)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute is not called for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("instrument_start"):
+        conn.info["instrument_start"].pop()
+
+
+def instrument(engine):
+    """Install the timing listeners on an engine (idempotent)"""
+    if engine in _instrumented:
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "checkin", _release_connection)
+    if not event.contains(Session, "after_begin", _attach_session):
+        event.listen(Session, "after_begin", _attach_session)
+        event.listen(Session, "after_transaction_end", _detach_session)
+    _instrumented.add(engine)
+    return engine
+
+
+@contextmanager
+def profile(engine, label="profile"):
+    """Record every statement run on `engine` in this context; yields a QueryProfile"""
+    instrument(engine)
+    prof = QueryProfile(label)
+    token = _active_profilers.set(_active_profilers.get() + (prof,))
+    try:
+        yield prof
+    finally:
+        _active_profilers.reset(token)
+        prof.elapsed = time.perf_counter() - prof.started
+
+
+def profiled(engine, label=None, report=print):
+    """Decorator form of profile(); passes the finished report to `report`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile(engine, label or func.__name__) as prof:
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    prof.elapsed = time.perf_counter() - prof.started
+                    report(prof.report())
+        return wrapper
+    return decorator
@@ -1,10 +1,18 @@
 import os
+import re
 import sys
+import json
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, event
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Index, Text, event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import Insert, UpdateBase
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql import operators
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, Session, deferred, object_session, selectinload
+from sqlalchemy.exc import SQLAlchemyError, InvalidRequestError
 from sqlalchemy import func
 
 
@@ -16,13 +24,74 @@ DB_CONFIG = {
     "database": "python_db"
 }
 
-DATABASE_URL = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+MARIADB_URL = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+
+# DB_PROFILE=sqlite runs the same models and workloads against a local
+# SQLite file instead of MariaDB (for benchmarks without a server).
+DB_PROFILE = os.environ.get("DB_PROFILE", "mariadb")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "task2.sqlite3")
+if DB_PROFILE == "sqlite":
+    DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+elif DB_PROFILE == "mariadb":
+    DATABASE_URL = MARIADB_URL
+else:
+    raise SystemExit(f"Unknown DB_PROFILE {DB_PROFILE!r}; use mariadb or sqlite")
+
+# Connection pool. Every unit of work checks a connection out of this pool,
+# so pool_size + max_overflow caps the number of concurrent units of work.
+# pre_ping tests a connection before handing it out (costs a round trip per
+# checkout); recycle replaces connections older than N seconds so the
+# server's wait_timeout never closes them first.
+POOL_SETTINGS = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+}
 
 # SQLAlchemy setup
+# Statement echo is expensive and untimed; opt in with SQL_ECHO=1 and use
+# app.instrumentation for timings instead.
+SQL_ECHO = os.environ.get("SQL_ECHO", "0") == "1"
+
+def make_engine(url=DATABASE_URL, echo=SQL_ECHO, **pool_settings):
+    """Engine for `url` with POOL_SETTINGS (overridable per call)"""
+    settings = {**POOL_SETTINGS, **pool_settings}
+    if url.startswith("sqlite"):
+        # Sessions move between threads; wait for locks instead of failing
+        new_engine = create_engine(url, echo=echo, connect_args={"check_same_thread": False, "timeout": 30},
+                                   **settings)
+        event.listen(new_engine, "connect", configure_sqlite_connection)
+        return new_engine
+    return create_engine(url, echo=echo, **settings)
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """WAL lets readers run next to the single writer; SQLite needs FKs switched on"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=True)
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-session = SessionLocal()
+# Thread-local session for the demo functions below. Call session.remove()
+# at the end of a unit of work; new code should prefer session_scope().
+session = scoped_session(SessionLocal)
+
+@contextmanager
+def session_scope():
+    """One unit of work: a fresh session, committed on success, rolled back on error, always closed"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
 # Models for DB
 class User(Base):
@@ -40,6 +109,9 @@ class User(Base):
 
 class Address(Base):
     __tablename__ = "addresses"
+    # User -> addresses loads, cascaded deletes. InnoDB already indexes FK
+    # columns, so create_missing_indexes() skips this one on MariaDB.
+    __table_args__ = (Index("ix_addresses_user_id", "user_id"),)
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("sqlalchemy_users.id"), nullable=False)
@@ -54,48 +126,274 @@ class Address(Base):
 
 class LogsUser(Base):
     __tablename__ = "logs_users"
+    __table_args__ = (
+        Index("ix_logs_users_timestamp", "timestamp"),                   # recent logs (print_logs)
+        Index("ix_logs_users_user_id_timestamp", "user_id", "timestamp"),  # one user's history, newest first
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     action = Column(String(10), nullable=False)  # INSERT, UPDATE, DELETE
     timestamp = Column(DateTime, default=func.now())
+    # JSON of changed columns, see AUDIT_CHANGED_COLUMNS. Deferred so that
+    # databases created before this column existed can still be queried.
+    changes = deferred(Column(Text, nullable=True))
     
     def __repr__(self):
         return f"<LogsUser(user_id={self.user_id}, action='{self.action}', timestamp={self.timestamp})>"
 
 # ORM Event Listeners for Logging
+# "batched": mapper events only collect log rows; after_flush writes all of
+#            them with one multi-row INSERT on the flush's own connection.
+# "per_row": the original behaviour, one LogsUser object per change that is
+#            only written by the next flush.
+AUDIT_MODE = os.environ.get("AUDIT_MODE", "batched")
+# Also store which columns changed (needs the logs_users.changes column)
+AUDIT_CHANGED_COLUMNS = os.environ.get("AUDIT_CHANGED_COLUMNS", "0") == "1"
+AUDITED_COLUMNS = ("name", "email")
+AUDIT_INSERT_CHUNK = 1000
+
+def audit_changes(target, action):
+    """JSON of audited columns: new values on INSERT, old/new on UPDATE, old on DELETE"""
+    state = inspect(target)
+    changes = {}
+    for column in AUDITED_COLUMNS:
+        history = state.attrs[column].history
+        if action == "INSERT":
+            changes[column] = {"new": getattr(target, column)}
+        elif action == "DELETE":
+            changes[column] = {"old": getattr(target, column)}
+        elif history.has_changes():
+            changes[column] = {
+                "old": history.deleted[0] if history.deleted else None,
+                "new": history.added[0] if history.added else None,
+            }
+    return json.dumps(changes, default=str)
+
+def audit_row(user_id, action, changes=None):
+    row = {"user_id": user_id, "action": action}
+    if AUDIT_CHANGED_COLUMNS:
+        row["changes"] = changes
+    return row
+
+def record_audit(target, action):
+    target_session = object_session(target)
+    changes = audit_changes(target, action) if AUDIT_CHANGED_COLUMNS else None
+    if AUDIT_MODE == "per_row":
+        target_session.add(LogsUser(**audit_row(target.id, action, changes)))
+    else:
+        target_session.info.setdefault("audit_pending", []).append(audit_row(target.id, action, changes))
+
+def write_audit_rows(connection, rows):
+    """Write collected log rows as multi-row INSERTs"""
+    for start in range(0, len(rows), AUDIT_INSERT_CHUNK):
+        connection.execute(LogsUser.__table__.insert().values(rows[start:start + AUDIT_INSERT_CHUNK]))
+
 def log_user_insert(mapper, connection, target):
     """Log INSERT operations"""
-    log_entry = LogsUser(user_id=target.id, action="INSERT")
-    session.add(log_entry)
+    record_audit(target, "INSERT")
 
 def log_user_update(mapper, connection, target):
     """Log UPDATE operations"""
-    log_entry = LogsUser(user_id=target.id, action="UPDATE")
-    session.add(log_entry)
+    record_audit(target, "UPDATE")
 
 def log_user_delete(mapper, connection, target):
     """Log DELETE operations"""
-    log_entry = LogsUser(user_id=target.id, action="DELETE")
-    session.add(log_entry)
+    record_audit(target, "DELETE")
+
+def flush_audit_log(session, flush_context):
+    """Write the log rows collected during this flush, in the same transaction"""
+    rows = session.info.pop("audit_pending", None)
+    if rows:
+        write_audit_rows(session.connection(), rows)
+
+def discard_audit_log(session):
+    """Changes from a failed flush / rolled back transaction are not logged"""
+    session.info.pop("audit_pending", None)
+
+# Writes to the users table that bypass the unit of work fire no mapper events:
+# bulk_insert_mappings / bulk_save_objects / bulk_update_mappings, ORM-enabled
+# session.execute(insert/update/delete(User)...), and Connection.execute on the table. They are logged from engine events on
+# the statement's own connection. Statements emitted while a flush writes
+# User rows are skipped, the mapper listeners above log those.
+_flushing_users = contextvars.ContextVar("flushing_users", default=False)
+_EMAIL_BIND = re.compile(r"email(_m\d+)?")  # multi-row .values([...]) binds email_m0, email_m1, ...
+
+def mark_user_flush(mapper, connection, target):
+    _flushing_users.set(True)
+
+def end_user_flush(session, flush_context):
+    _flushing_users.set(False)
+
+def abort_user_flush(session, previous_transaction):
+    _flushing_users.set(False)
+
+def is_unlogged_user_write(statement):
+    if _flushing_users.get() or not isinstance(statement, UpdateBase):
+        return False
+    return getattr(statement.table, "name", None) == User.__tablename__
+
+def audited_users(connection, where, param_sets):
+    """{id: audited column values} of the users matching `where`, once per parameter set"""
+    users = User.__table__
+    columns = [users.c.id] + ([users.c[c] for c in AUDITED_COLUMNS] if AUDIT_CHANGED_COLUMNS else [])
+    if (isinstance(where, BinaryExpression) and where.operator is operators.eq
+            and getattr(where.left, "key", None) == "id" and isinstance(where.right, BindParameter)):
+        # WHERE id = :param (bulk UPDATE by primary key, bulk_save_objects): one IN query for all rows
+        ids = [p.get(where.right.key, where.right.value) for p in param_sets]
+        rows = []
+        for start in range(0, len(ids), AUDIT_INSERT_CHUNK):
+            rows += connection.execute(select(*columns).where(users.c.id.in_(ids[start:start + AUDIT_INSERT_CHUNK])))
+    else:
+        query = select(*columns) if where is None else select(*columns).where(where)
+        rows = [row for params in param_sets for row in connection.execute(query, params)]
+    return {row[0]: dict(zip(AUDITED_COLUMNS, row[1:])) for row in rows}
+
+def audit_core_write(conn, clauseelement, multiparams, params, execution_options):
+    """Before an UPDATE/DELETE outside the unit of work, note which users it will touch"""
+    if not is_unlogged_user_write(clauseelement):
+        return
+    if isinstance(clauseelement, Insert):
+        if clauseelement.select is not None:
+            raise InvalidRequestError("INSERT ... SELECT into sqlalchemy_users cannot be audited; insert the rows")
+        return
+    matched = audited_users(conn, clauseelement.whereclause, list(multiparams) or [params or {}])
+    conn.info.setdefault("audit_matched", {})[id(clauseelement)] = matched
+
+def audit_core_insert(conn, result):
+    """Log the users an INSERT wrote; MySQL has no RETURNING, so ids are looked up by the unique email"""
+    by_email = {}
+    for params in result.context.compiled_parameters:
+        for key, email in params.items():
+            match = _EMAIL_BIND.fullmatch(key)
+            if match and email is not None:
+                by_email[email] = {c: params.get(c + (match.group(1) or "")) for c in AUDITED_COLUMNS}
+    emails = list(by_email)
+    rows = []
+    for start in range(0, len(emails), AUDIT_INSERT_CHUNK):
+        chunk = emails[start:start + AUDIT_INSERT_CHUNK]
+        for user_id, email in conn.execute(select(User.id, User.email).where(User.email.in_(chunk))):
+            changes = {c: {"new": by_email[email][c]} for c in AUDITED_COLUMNS}
+            rows.append(audit_row(user_id, "INSERT", json.dumps(changes, default=str)))
+    return rows
+
+def audit_core_write_done(conn, clauseelement, multiparams, params, execution_options, result):
+    """Log an INSERT/UPDATE/DELETE outside the unit of work once it succeeded, on the same connection"""
+    if not is_unlogged_user_write(clauseelement):
+        return
+    if isinstance(clauseelement, Insert):
+        rows = audit_core_insert(conn, result)
+    else:
+        matched = conn.info.get("audit_matched", {}).pop(id(clauseelement), {})
+        action = "DELETE" if clauseelement.is_delete else "UPDATE"
+        after = audited_users(conn, User.id.in_(list(matched)), [{}]) \
+            if AUDIT_CHANGED_COLUMNS and action == "UPDATE" and matched else {}
+        rows = []
+        for user_id, old in matched.items():
+            changes = None
+            if AUDIT_CHANGED_COLUMNS and action == "DELETE":
+                changes = json.dumps({c: {"old": old[c]} for c in AUDITED_COLUMNS}, default=str)
+            elif AUDIT_CHANGED_COLUMNS:
+                new = after.get(user_id, old)
+                changes = json.dumps({c: {"old": old[c], "new": new[c]} for c in AUDITED_COLUMNS
+                                      if old[c] != new[c]}, default=str)
+            rows.append(audit_row(user_id, action, changes))
+    if rows:
+        write_audit_rows(conn, rows)
+
+def forget_core_write(exception_context):
+    """A failed UPDATE/DELETE is not logged"""
+    conn = exception_context.connection
+    if conn is not None and not conn.invalidated:
+        conn.info.pop("audit_matched", None)
 
 # Register event listeners
 event.listen(User, "after_insert", log_user_insert)
 event.listen(User, "after_update", log_user_update)
 event.listen(User, "before_delete", log_user_delete)
+for _event in ("before_insert", "before_update", "before_delete"):
+    event.listen(User, _event, mark_user_flush)
+event.listen(Session, "after_flush", flush_audit_log)
+event.listen(Session, "after_flush", end_user_flush)
+event.listen(Session, "after_rollback", discard_audit_log)
+event.listen(Session, "after_soft_rollback", abort_user_flush)
+event.listen(Engine, "before_execute", audit_core_write)
+event.listen(Engine, "after_execute", audit_core_write_done)
+event.listen(Engine, "handle_error", forget_core_write)
 
 # Utilities
 def create_tables():
     """Create all tables if they don't exist"""
     print("Creating tables...")
     Base.metadata.create_all(bind=engine)
+    created = create_missing_indexes()
+    if created:
+        print(f"Created indexes: {', '.join(created)}")
     print("Tables created successfully!")
 
-def print_users_and_addresses():
+def create_missing_indexes(bind=None):
+    """Create model indexes missing from existing tables; returns their names.
+
+    create_all() only creates indexes together with a new table. An index is
+    skipped when an existing index or unique key already starts with its
+    columns (e.g. the implicit InnoDB index on a foreign key).
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = inspector.get_indexes(table.name) + inspector.get_unique_constraints(table.name)
+        names = {ix["name"] for ix in existing}
+        prefixes = [tuple(ix["column_names"]) for ix in existing]
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            columns = tuple(column.name for column in index.columns)
+            if index.name in names or any(prefix[:len(columns)] == columns for prefix in prefixes):
+                continue
+            index.create(bind)
+            created.append(index.name)
+    return created
+
+# Reporting
+REPORT_BATCH_SIZE = 500
+
+def users_with_addresses_query(city=None, email_domain=None, batch_size=REPORT_BATCH_SIZE):
+    """One keyset window of users with their addresses; add .where(User.id > last_id)"""
+    address_loader = selectinload(User.addresses)
+    query = select(User)
+    if city:
+        query = query.where(User.addresses.any(Address.city == city))
+        address_loader = selectinload(User.addresses.and_(Address.city == city))
+    if email_domain:
+        query = query.where(User.email.like(f"%@{email_domain}"))
+    return query.options(address_loader).order_by(User.id).limit(batch_size)
+
+def iter_users_with_addresses(db, city=None, email_domain=None, batch_size=REPORT_BATCH_SIZE):
+    """Yield users with their addresses already loaded, in windows of batch_size users.
+
+    Each window costs two statements no matter how many users it holds: one
+    keyset-paginated SELECT of users and one IN-query for their addresses
+    (selectinload). Keyset windows are used instead of yield_per because a
+    MySQL streaming cursor cannot run the selectin query on the same
+    connection. The identity map only keeps weak references to unmodified
+    objects, so earlier windows are freed once the caller lets go of them.
+    city: users with an address in that city (only those addresses are loaded)
+    email_domain: users whose email ends with @email_domain
+    """
+    query = users_with_addresses_query(city, email_domain, batch_size)
+    last_id = 0
+    while True:
+        users = db.execute(query.where(User.id > last_id)).scalars().all()
+        yield from users
+        if len(users) < batch_size:
+            break
+        last_id = users[-1].id
+
+def print_users_and_addresses(city=None, email_domain=None):
     """Print all users with their addresses"""
-    users = session.query(User).all()
     print("\n=== USERS AND ADDRESSES ===")
-    for user in users:
+    for user in iter_users_with_addresses(session, city=city, email_domain=email_domain):
         print(f"User: {user.name} ({user.email})")
         if user.addresses:
             for addr in user.addresses:
@@ -117,6 +415,7 @@ def insert_users_with_transaction():
     """Task 2: Insert multiple users with transaction handling"""
     print("\n=== TASK 2: TRANSACTION HANDLING ===")
     
+    db = SessionLocal()
     try:
         # Create multiple users
         user1 = User(name="Alice Smith", email="alice@example.com")
@@ -124,24 +423,25 @@ def insert_users_with_transaction():
         user3 = User(name="Charlie Brown", email="charlie@example.com")
         
         # Add all to session
-        session.add_all([user1, user2, user3])
-        session.flush()  # Flush to generate IDs for logging
+        db.add_all([user1, user2, user3])
+        db.flush()  # Flush to generate IDs for logging
         
         # Simulate an error (uncomment to test rollback)
         
-        session.commit()
+        db.commit()
         print("Transaction committed: 3 users added successfully!")
         
     except SQLAlchemyError as e:
-        session.rollback()
+        db.rollback()
         print(f"Transaction rolled back due to error: {e}")
     finally:
-        session.close()
-        session = SessionLocal()
+        db.close()
 
 # Relationships
 def demonstrate_relationships():
     """Task 3: Demonstrate User-Address relationships"""
+    from .cache import get_user
+
     print("\n=== TASK 3: USER-ADDRESS RELATIONSHIPS ===")
     
     # Find Alice and add addresses
@@ -153,18 +453,21 @@ def demonstrate_relationships():
         session.commit()
         print("Added addresses to Alice")
     
-    # Query Bob and print his addresses
-    bob = session.query(User).filter_by(name="Bob Johnson").first()
+    # Query Bob and print his addresses (served from the user cache when USER_CACHE=1)
+    bob = get_user(session, email="bob@example.com")
     if bob:
-        print(f"Bob's addresses: {[addr.city for addr in bob.addresses]}")
+        print(f"Bob's addresses: {[addr['city'] for addr in bob['addresses']]}")
     
     print_users_and_addresses()
 
 
 def main():
     """Main application entry point"""
+    from .instrumentation import instrument, profile
+
     print("SQLAlchemy MySQL Application Starting...")
-    print(f"Database: {DATABASE_URL}")
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    instrument(engine)
     
     try:
         
@@ -174,7 +477,9 @@ def main():
         insert_users_with_transaction()
         
         # Relationships demo
-        demonstrate_relationships()
+        with profile(engine, "demonstrate_relationships") as prof:
+            demonstrate_relationships()
+        print(prof.report())
         
         # Show logs
         print_logs()
@@ -195,12 +500,16 @@ def main():
             print(f"Deleted user {last_user.id} (logged automatically)")
         
         print_logs()
+
+        from .cache import USER_CACHE_ENABLED, user_cache
+        if USER_CACHE_ENABLED:
+            print(f"User cache: {user_cache.snapshot()}")
         
     except Exception as e:
         print(f"Error: {e}")
         session.rollback()
     finally:
-        session.close()
+        session.remove()
         print("\nApplication completed successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+import csv
+import json
+import os
+import time
+from itertools import groupby, islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from .main import SessionLocal, User, Address
+
+# Users per chunk: one multi-row INSERT for users, one for their addresses,
+# one commit (unless --atomic) and one checkpoint per chunk.
+CHUNK_SIZE = 1000
+CSV_FIELDS = ["name", "email", "street", "city"]
+
+
+class TransferError(Exception):
+    pass
+
+
+def detect_format(path, fmt=None):
+    """csv or ndjson, from --format or the file extension"""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise TransferError(f"Cannot tell the format of {path}; use --format csv|ndjson")
+
+
+# Record layout: {"name": ..., "email": ..., "addresses": [{"street": ..., "city": ...}]}
+# NDJSON has one record per line. CSV has one line per address with the
+# user's name/email repeated (empty street/city for users without
+# addresses); lines of the same user must be adjacent.
+def read_records(path, fmt):
+    """Yield user records one at a time"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record.setdefault("addresses", [])
+                    yield record
+        else:
+            for (name, email), lines in groupby(csv.DictReader(f), key=lambda r: (r["name"], r["email"])):
+                addresses = [{"street": r["street"], "city": r["city"]} for r in lines if r.get("street")]
+                yield {"name": name, "email": email, "addresses": addresses}
+
+
+def write_records(f, fmt, records):
+    if fmt == "ndjson":
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    else:
+        writer = csv.writer(f)
+        for record in records:
+            if not record["addresses"]:
+                writer.writerow([record["name"], record["email"], "", ""])
+            for addr in record["addresses"]:
+                writer.writerow([record["name"], record["email"], addr["street"], addr["city"]])
+
+
+def checkpoint_path(path):
+    return path + ".checkpoint"
+
+
+def load_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)["records_done"]
+    except FileNotFoundError:
+        return 0
+
+
+def save_checkpoint(path, records_done):
+    tmp = checkpoint_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"records_done": records_done}, f)
+    os.replace(tmp, checkpoint_path(path))
+
+
+def import_chunk(session, records, on_conflict):
+    """Insert one chunk of users and their addresses; returns (users, addresses, skipped)"""
+    emails = [r["email"] for r in records]
+    existing = {e.lower() for e in session.execute(select(User.email).where(User.email.in_(emails))).scalars()}
+    if existing and on_conflict == "fail":
+        raise TransferError(f"{len(existing)} email(s) already exist, e.g. {sorted(existing)[0]}")
+
+    new_records, seen = [], set(existing)
+    for record in records:
+        key = record["email"].lower()
+        if key not in seen:
+            seen.add(key)
+            new_records.append(record)
+    if not new_records:
+        return 0, 0, len(records)
+
+    session.execute(insert(User), [{"name": r["name"], "email": r["email"]} for r in new_records])
+    # Resolve the new user ids for the whole chunk in one query
+    new_emails = [r["email"] for r in new_records]
+    ids = {email.lower(): user_id for email, user_id in
+           session.execute(select(User.email, User.id).where(User.email.in_(new_emails)))}
+    addresses = [
+        {"user_id": ids[r["email"].lower()], "street": a["street"], "city": a["city"]}
+        for r in new_records for a in r["addresses"]
+    ]
+    if addresses:
+        session.execute(insert(Address), addresses)
+    return len(new_records), len(addresses), len(records) - len(new_records)
+
+
+def import_users(path, fmt=None, chunk_size=CHUNK_SIZE, atomic=False, on_conflict="skip", resume=True):
+    """Stream users and addresses from a CSV/NDJSON file into the database"""
+    fmt = detect_format(path, fmt)
+    done = load_checkpoint(path) if resume and not atomic else 0
+    if done:
+        print(f"Resuming after {done} records (from {checkpoint_path(path)})")
+
+    records = islice(read_records(path, fmt), done, None)
+    totals = {"users": 0, "addresses": 0, "skipped": 0}
+    started = time.perf_counter()
+    session = SessionLocal()
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            users, addresses, skipped = import_chunk(session, chunk, on_conflict)
+            totals["users"] += users
+            totals["addresses"] += addresses
+            totals["skipped"] += skipped
+            done += len(chunk)
+            if not atomic:
+                session.commit()
+                save_checkpoint(path, done)
+            elapsed = time.perf_counter() - started
+            print(f"{done} records read, {totals['users']} users imported ({totals['users'] / elapsed:.0f} users/s)")
+        session.commit()
+    except (SQLAlchemyError, TransferError, ValueError, KeyError) as e:
+        session.rollback()
+        print(f"Import stopped after {done} records: {e}")
+        if atomic:
+            print("Atomic import: nothing was written.")
+        else:
+            print("Committed chunks are kept; run the same command again to resume.")
+        raise
+    finally:
+        session.close()
+
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = round(elapsed, 2)
+    totals["rows_per_sec"] = round((totals["users"] + totals["addresses"]) / elapsed, 1) if elapsed else None
+    print(f"Import finished: {totals}")
+    return totals
+
+
+def export_users(path, fmt=None, chunk_size=CHUNK_SIZE):
+    """Stream all users with their addresses to a CSV/NDJSON file"""
+    fmt = detect_format(path, fmt)
+    started = time.perf_counter()
+    exported = 0
+    last_id = 0
+    session = SessionLocal()
+    try:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                csv.writer(f).writerow(CSV_FIELDS)
+            while True:
+                # Keyset pagination on the primary key, one address query per chunk
+                users = session.execute(
+                    select(User.id, User.name, User.email).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+                ).all()
+                if not users:
+                    break
+                ids = [u.id for u in users]
+                addresses = {}
+                for user_id, street, city in session.execute(
+                    select(Address.user_id, Address.street, Address.city)
+                    .where(Address.user_id.in_(ids)).order_by(Address.user_id, Address.id)
+                ):
+                    addresses.setdefault(user_id, []).append({"street": street, "city": city})
+                write_records(f, fmt, (
+                    {"name": u.name, "email": u.email, "addresses": addresses.get(u.id, [])} for u in users
+                ))
+                exported += len(users)
+                last_id = ids[-1]
+                print(f"{exported} users exported ({exported / (time.perf_counter() - started):.0f} users/s)")
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - started
+    totals = {"users": exported, "seconds": round(elapsed, 2),
+              "users_per_sec": round(exported / elapsed, 1) if elapsed else None}
+    print(f"Export finished: {totals}")
+    return totals
@@ -0,0 +1,16 @@
+"""Run the task2 tests against a throwaway SQLite database (DB_PROFILE=sqlite).
+
+The engine is built when app.main is imported, so the profile is set here,
+before any test module imports the app.
+"""
+import os
+import sys
+import tempfile
+
+TASK2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SQLITE_PATH = os.path.join(tempfile.mkdtemp(prefix="task2-tests-"), "task2.db")
+
+os.environ["DB_PROFILE"] = "sqlite"
+os.environ["SQLITE_PATH"] = SQLITE_PATH
+os.environ.setdefault("SQL_ECHO", "0")
+sys.path.insert(0, TASK2_DIR)
@@ -0,0 +1,160 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import InvalidRequestError
+
+import app.main as app_main
+from app.benchmarks import cleanup_users
+from app.main import LogsUser, SessionLocal, User, create_tables, engine
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    create_tables()
+
+
+@pytest.fixture
+def prefix():
+    prefix = f"audit-{uuid.uuid4().hex[:8]}-"
+    yield prefix
+    cleanup_users(prefix)
+
+
+@pytest.fixture
+def changed_columns(monkeypatch):
+    monkeypatch.setattr(app_main, "AUDIT_CHANGED_COLUMNS", True)
+
+
+def users(prefix, count):
+    return [{"name": f"Audit {i}", "email": f"{prefix}{i}@audit.example"} for i in range(count)]
+
+
+def user_ids(prefix):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(User.id).where(User.email.like(prefix + "%"))).scalars())
+
+
+def audit_log(prefix, action):
+    """user_id -> number of `action` rows, for the users whose email starts with `prefix`"""
+    with engine.connect() as conn:
+        ids = conn.execute(select(User.id).where(User.email.like(prefix + "%"))).scalars().all()
+        rows = conn.execute(select(LogsUser.user_id).where(LogsUser.action == action,
+                                                           LogsUser.user_id.in_(ids))).scalars()
+        counts = {}
+        for user_id in rows:
+            counts[user_id] = counts.get(user_id, 0) + 1
+        return counts
+
+
+def assert_logged_once(prefix, action, count):
+    ids = user_ids(prefix)
+    assert len(ids) == count
+    assert audit_log(prefix, action) == {user_id: 1 for user_id in ids}
+
+
+def test_unit_of_work_is_logged_once(prefix):
+    with SessionLocal.begin() as db:
+        db.add_all(User(**row) for row in users(prefix, 3))
+    assert_logged_once(prefix, "INSERT", 3)
+    with SessionLocal.begin() as db:
+        for user in db.scalars(select(User).where(User.email.like(prefix + "%"))):
+            user.name = "Renamed"
+    assert_logged_once(prefix, "UPDATE", 3)
+
+
+def test_bulk_insert_mappings(prefix):
+    with SessionLocal.begin() as db:
+        db.bulk_insert_mappings(User, users(prefix, 3))
+    assert_logged_once(prefix, "INSERT", 3)
+
+
+def test_bulk_save_objects(prefix):
+    with SessionLocal.begin() as db:
+        db.bulk_save_objects([User(**row) for row in users(prefix, 3)])
+    assert_logged_once(prefix, "INSERT", 3)
+    with SessionLocal() as db:
+        saved = db.scalars(select(User).where(User.email.like(prefix + "%"))).all()
+    for user in saved:
+        user.name = "Renamed"
+    with SessionLocal.begin() as db:
+        db.bulk_save_objects(saved)
+    assert_logged_once(prefix, "UPDATE", 3)
+
+
+def test_bulk_update_mappings(prefix):
+    with SessionLocal.begin() as db:
+        db.bulk_insert_mappings(User, users(prefix, 3))
+    with SessionLocal.begin() as db:
+        db.bulk_update_mappings(User, [{"id": user_id, "name": "Renamed"} for user_id in user_ids(prefix)])
+    assert_logged_once(prefix, "UPDATE", 3)
+
+
+def test_orm_bulk_insert(prefix):
+    with SessionLocal.begin() as db:
+        db.execute(insert(User), users(prefix, 3))
+    assert_logged_once(prefix, "INSERT", 3)
+
+
+def test_orm_insert_values(prefix):
+    with SessionLocal.begin() as db:
+        db.execute(insert(User).values(**users(prefix, 1)[0]))
+        db.execute(insert(User).values(users(prefix, 3)[1:]))
+    assert_logged_once(prefix, "INSERT", 3)
+
+
+def test_orm_bulk_update_and_delete(prefix):
+    with SessionLocal.begin() as db:
+        db.execute(insert(User), users(prefix, 3))
+    ids = user_ids(prefix)
+    with SessionLocal.begin() as db:
+        db.execute(update(User).where(User.email.like(prefix + "%")).values(name="Renamed"))
+        db.execute(update(User), [{"id": user_id, "name": "Again"} for user_id in ids])
+    assert audit_log(prefix, "UPDATE") == {user_id: 2 for user_id in ids}
+    with SessionLocal.begin() as db:
+        db.execute(delete(User).where(User.id == ids[0]))
+    with engine.begin() as conn:
+        deleted = conn.execute(select(LogsUser.user_id).where(LogsUser.action == "DELETE",
+                                                              LogsUser.user_id.in_(ids))).scalars().all()
+        conn.execute(delete(LogsUser).where(LogsUser.user_id == ids[0]))
+    assert deleted == [ids[0]]
+
+
+def test_core_insert_update_delete(prefix, changed_columns):
+    table = User.__table__
+    with engine.begin() as conn:
+        conn.execute(table.insert(), users(prefix, 3))
+    assert_logged_once(prefix, "INSERT", 3)
+    ids = user_ids(prefix)
+    with engine.begin() as conn:
+        conn.execute(table.update().where(table.c.id == ids[0]).values(name="Renamed"))
+    with engine.connect() as conn:
+        changes = conn.execute(select(LogsUser.changes).where(LogsUser.user_id == ids[0],
+                                                              LogsUser.action == "UPDATE")).scalar_one()
+    assert json.loads(changes) == {"name": {"old": "Audit 0", "new": "Renamed"}}
+    with engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.id.in_(ids[1:])))
+        deleted = conn.execute(select(LogsUser.user_id).where(LogsUser.action == "DELETE",
+                                                              LogsUser.user_id.in_(ids))).scalars().all()
+        conn.execute(delete(LogsUser).where(LogsUser.user_id.in_(ids[1:])))
+    assert sorted(deleted) == ids[1:]
+
+
+def test_failed_core_write_is_not_logged(prefix):
+    table = User.__table__
+    with engine.begin() as conn:
+        conn.execute(table.insert(), users(prefix, 2))
+    ids = user_ids(prefix)
+    with pytest.raises(Exception):
+        with engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == ids[0]).values(email=f"{prefix}1@audit.example"))
+    assert audit_log(prefix, "UPDATE") == {}
+
+
+def test_insert_from_select_is_rejected(prefix):
+    table = User.__table__
+    source = select(table.c.name, (table.c.email + "-copy").label("email")).where(table.c.email.like(prefix + "%"))
+    with pytest.raises(InvalidRequestError):
+        with engine.begin() as conn:
+            conn.execute(table.insert().from_select(["name", "email"], source))
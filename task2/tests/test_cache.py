@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+import app.cache as cache
+from app.benchmarks import cleanup_users
+from app.main import SessionLocal, User, create_tables
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    create_tables()
+
+
+@pytest.fixture
+def user_cache(monkeypatch):
+    monkeypatch.setattr(cache, "USER_CACHE_ENABLED", True)
+    user_cache = cache.UserCache()
+    monkeypatch.setattr(cache, "user_cache", user_cache)
+    return user_cache
+
+
+@pytest.fixture
+def email():
+    prefix = f"cache-{uuid.uuid4().hex[:8]}-"
+    with SessionLocal.begin() as db:
+        db.add(User(name="Cached", email=f"{prefix}0@cache.example"))
+    yield f"{prefix}0@cache.example"
+    cleanup_users(prefix)
+
+
+def test_fill_is_dropped_when_invalidated_during_the_transaction(user_cache, email):
+    reader = SessionLocal()
+    reader.execute(select(1))  # the reading transaction (and its snapshot) starts here
+    with SessionLocal.begin() as writer:
+        writer.scalars(select(User).where(User.email == email)).one().name = "Renamed"
+    assert cache.get_user(reader, email=email) is not None
+    reader.close()
+    assert user_cache.get(email=email) is None
+    assert user_cache.stats["stale_fills"] == 1
+
+    with SessionLocal() as db:
+        assert cache.get_user(db, email=email)["name"] == "Renamed"
+    assert user_cache.get(email=email)["name"] == "Renamed"
+
+
+def test_entries_expire(user_cache, email, monkeypatch):
+    with SessionLocal() as db:
+        cache.get_user(db, email=email)
+    assert user_cache.get(email=email) is not None
+    now = cache.time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + user_cache.ttl + 1)
+    assert user_cache.get(email=email) is None
+    assert user_cache.stats["expired"] == 1
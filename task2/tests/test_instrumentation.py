@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+from conftest import TASK2_DIR
+
+
+def test_python_m_app_commits_with_instrumentation(tmp_path):
+    env = dict(os.environ, DB_PROFILE="sqlite", SQLITE_PATH=str(tmp_path / "app.db"))
+    result = subprocess.run([sys.executable, "-m", "app"], cwd=TASK2_DIR, env=env,
+                            capture_output=True, text=True, timeout=120)
+    output = result.stdout + result.stderr
+    assert result.returncode == 0, output
+    assert "=== SQL PROFILE: demonstrate_relationships ===" in output
+    assert "Transaction committed" in output
+    assert "rolled back" not in output and "Connection is closed" not in output
+    assert "Application completed successfully!" in output
+
+
+def test_pooled_connection_tag_cleared_on_checkin():
+    from sqlalchemy import select
+
+    from app.instrumentation import instrument
+    from app.main import SessionLocal, User, create_tables, engine
+
+    create_tables()
+    instrument(engine)
+    db = SessionLocal()
+    connection = db.connection()
+    record_info = connection.info
+    assert record_info["instrument_session"]() is db
+    db.execute(select(User).limit(1))
+    db.commit()  # must not raise ResourceClosedError
+    assert "instrument_session" not in record_info
+    db.close()
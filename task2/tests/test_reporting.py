@@ -0,0 +1,34 @@
+import math
+import uuid
+
+import pytest
+
+from app.benchmarks import StatementCounter, cleanup_users, seed_users
+from app.main import SessionLocal, create_tables, engine, iter_users_with_addresses
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    create_tables()
+
+
+@pytest.mark.parametrize("users, batch_size", [(1, 100), (250, 100), (300, 100), (1000, 100)])
+def test_report_statements_do_not_depend_on_user_count(users, batch_size):
+    prefix = f"report-{uuid.uuid4().hex[:8]}-"
+    domain = f"{prefix}test.example"
+    seed_users(prefix, domain, users, addresses_per_user=2)
+    try:
+        session = SessionLocal()
+        with StatementCounter(engine) as counter:
+            seen = 0
+            for user in iter_users_with_addresses(session, email_domain=domain, batch_size=batch_size):
+                seen += len(user.addresses)  # must not trigger lazy loads
+        session.close()
+    finally:
+        cleanup_users(prefix)
+
+    windows = math.ceil(users / batch_size)
+    # two statements per window, plus one empty SELECT when the last window is full
+    expected = 2 * windows + (1 if users % batch_size == 0 else 0)
+    assert seen == 2 * users
+    assert counter.count == expected
@@ -0,0 +1,565 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+import main as app_main
+from main import app, db, students_collection, reconcile_indexes
+
+MAJORS = ["Mathematics", "Computer Science", "Biology", "Physics", "Chemistry", "History", "Economics"]
+COURSES = [("Algebra", 5), ("Databases", 6), ("Genetics", 4), ("Mechanics", 5), ("Statistics", 3)]
+GRADES = ["A", "B", "C", "D"]
+
+
+def synthetic_student(prefix, i):
+    return {
+        "name": f"Student {i}",
+        "email": f"{prefix}{i}@bench.example",
+        "major": MAJORS[i % len(MAJORS)],
+        "courses": [{"title": title, "credits": credits, "grade": GRADES[(i + n) % len(GRADES)]}
+                    for n, (title, credits) in enumerate(COURSES[:3])],
+    }
+
+
+def seed_students(prefix, start, stop, batch_size=10_000):
+    for first in range(start, stop, batch_size):
+        students_collection.insert_many(
+            [synthetic_student(prefix, i) for i in range(first, min(first + batch_size, stop))], ordered=False)
+
+
+def cleanup_students(prefix):
+    students_collection.delete_many({"email": {"$regex": f"^{re.escape(prefix)}"}})
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "count": len(ordered)}
+
+
+def test_client():
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        raise SystemExit("The benchmarks drive the app in-process and need httpx: pip install httpx")
+    return TestClient(app)
+
+
+# Listing: time to first byte and peak memory of GET /students/ as the
+# collection grows. Both should stay flat for the streaming and paged paths.
+def bench_listing(sizes, page_size, pages, batch_size):
+    client = test_client()
+    prefix = f"list-{uuid.uuid4().hex[:8]}-"
+    report = {}
+    seeded = 0
+    try:
+        for size in sizes:
+            seed_students(prefix, seeded, size)
+            seeded = size
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            first_byte = None
+            streamed = 0
+            with client.stream("GET", f"/students/?format=ndjson&batch_size={batch_size}") as response:
+                for line in response.iter_lines():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    streamed += bool(line)
+            stream_seconds = time.perf_counter() - started
+            _, stream_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            page_ms = []
+            after = None
+            for _ in range(pages):
+                url = f"/students/?limit={page_size}&sort=email" + (f"&after={after}" if after else "")
+                started = time.perf_counter()
+                response = client.get(url)
+                page_ms.append(round((time.perf_counter() - started) * 1000, 2))
+                after = response.headers.get("X-Next-Cursor")
+                if not after:
+                    break
+
+            report[size] = {
+                "ndjson_first_byte_ms": round(first_byte * 1000, 2) if first_byte is not None else None,
+                "ndjson_docs": streamed,
+                "ndjson_docs_per_sec": round(streamed / stream_seconds, 1),
+                "ndjson_peak_mb": round(stream_peak / 2**20, 2),
+                "page_ms": page_ms,
+            }
+            print(f"{size} students: {report[size]}")
+    finally:
+        cleanup_students(prefix)
+    return report
+
+
+# Indexes: the app's queries against a separate collection of synthetic
+# students, with the declared indexes and with only _id.
+def timed(samples, operation, *args):
+    started = time.perf_counter()
+    operation(*args)
+    samples.append(time.perf_counter() - started)
+
+
+def run_student_workload(collection, prefix, size, queries, rng):
+    def email():
+        return f"{prefix}{rng.randrange(size)}@bench.example"
+
+    def new_student():
+        return dict(synthetic_student(prefix, size), email=f"{prefix}new-{rng.randrange(10**9)}@bench.example")
+
+    def add_two_trips(doc):
+        # The old add_student: look for the email, then insert
+        if collection.find_one({"email": doc["email"]}) is None:
+            collection.insert_one(doc)
+
+    def add_one_trip(doc):
+        try:
+            collection.insert_one(doc)
+        except DuplicateKeyError:
+            pass
+
+    def delete_and_restore(address):
+        doc = collection.find_one_and_delete({"email": address})
+        if doc is not None:
+            collection.insert_one(doc)
+
+    workloads = {
+        "get_by_email": lambda: collection.find_one({"email": email()}, {"_id": 0}),
+        "by_major_first_100": lambda: list(collection.find({"major": rng.choice(MAJORS)}).limit(100)),
+        "update_major": lambda: collection.update_one({"email": email()}, {"$set": {"major": rng.choice(MAJORS)}}),
+        "delete_and_restore": lambda: delete_and_restore(email()),
+        "add_find_then_insert": lambda: add_two_trips(new_student()),
+    }
+    if any(info.get("unique") for info in collection.index_information().values()):
+        workloads["add_insert_only"] = lambda: add_one_trip(new_student())
+
+    result = {}
+    try:
+        for name, operation in workloads.items():
+            samples = []
+            for _ in range(queries):
+                timed(samples, operation)
+            result[name] = percentiles(samples)
+    finally:
+        collection.delete_many({"email": {"$regex": f"^{re.escape(prefix)}new-"}})
+    return result
+
+
+def bench_indexes(collection_name, size, queries, seed):
+    collection = db[collection_name]
+    prefix = "idx-"
+    rng = random.Random(seed)
+    collection.delete_many({"email": {"$regex": f"^{re.escape(prefix)}new-"}})
+    existing = collection.count_documents({})
+    if existing < size:
+        print(f"Seeding {collection_name} from {existing} to {size} students...")
+        for first in range(existing, size, 10_000):
+            collection.insert_many([synthetic_student(prefix, i) for i in range(first, min(first + 10_000, size))],
+                                   ordered=False)
+
+    report = {"collection": collection_name, "students": size, "queries": queries}
+    collection.drop_indexes()
+    report["without_indexes"] = run_student_workload(collection, prefix, size, queries, rng)
+    print(f"without_indexes: {report['without_indexes']}")
+    started = time.perf_counter()
+    report["index_build"] = reconcile_indexes(collection)
+    report["index_build_seconds"] = round(time.perf_counter() - started, 2)
+    report["with_indexes"] = run_student_workload(collection, prefix, size, queries, rng)
+    print(f"with_indexes: {report['with_indexes']}")
+    return report
+
+
+# Ingestion: POST /students/ once per student vs POST /students/bulk
+def bench_bulk(students, chunk_size, single_limit):
+    client = test_client()
+    report = {}
+
+    prefix = f"single-{uuid.uuid4().hex[:8]}-"
+    count = min(students, single_limit)
+    started = time.perf_counter()
+    for i in range(count):
+        client.post("/students/", json=synthetic_student(prefix, i))
+    elapsed = time.perf_counter() - started
+    report["single"] = {"docs": count, "seconds": round(elapsed, 3), "docs_per_sec": round(count / elapsed, 1)}
+    cleanup_students(prefix)
+
+    for fmt in ("json", "ndjson"):
+        prefix = f"bulk-{uuid.uuid4().hex[:8]}-"
+        docs = [synthetic_student(prefix, i) for i in range(students)]
+        if fmt == "json":
+            body, content_type = json.dumps(docs), "application/json"
+        else:
+            body, content_type = "\n".join(json.dumps(doc) for doc in docs), "application/x-ndjson"
+        started = time.perf_counter()
+        response = client.post(f"/students/bulk?chunk_size={chunk_size}&report=errors", content=body,
+                               headers={"Content-Type": content_type})
+        elapsed = time.perf_counter() - started
+        summary = response.json()["summary"]
+        report[f"bulk_{fmt}"] = {"docs": students, "inserted": summary.get("inserted", 0),
+                                 "seconds": round(elapsed, 3), "docs_per_sec": round(students / elapsed, 1),
+                                 "server_docs_per_sec": summary["docs_per_sec"]}
+        cleanup_students(prefix)
+
+    report["speedup"] = round(report["bulk_ndjson"]["docs_per_sec"] / report["single"]["docs_per_sec"], 1)
+    return report
+
+
+# Drivers: requests/sec and latency of the API served with MONGO_DRIVER=sync
+# (blocking pymongo on the thread pool) vs MONGO_DRIVER=async
+def wait_until_up(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as res:
+                if res.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.05)
+    return False
+
+
+def load_result(latencies, errors, elapsed):
+    result = {"requests": len(latencies), "errors": errors, "requests_per_sec": round(len(latencies) / elapsed, 1)}
+    if latencies:
+        result.update(percentiles(latencies))
+    return result
+
+
+async def load_test_httpx(base_url, paths, clients, duration):
+    import httpx
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async def client(http, rng):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await http.get(rng.choice(paths))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http, random.Random(n)) for n in range(clients)))
+    return load_result(latencies, errors, time.perf_counter() - started)
+
+
+def load_test_threads(base_url, paths, clients, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(rng):
+        nonlocal errors
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + rng.choice(paths), timeout=30) as res:
+                    res.read()
+                local.append(time.perf_counter() - started)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=client, args=(random.Random(n),)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return load_result(latencies, errors, time.perf_counter() - started)
+
+
+def load_test(base_url, paths, clients, duration):
+    # httpx keeps 500 clients on one event loop; threads are the fallback
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        return load_test_threads(base_url, paths, clients, duration)
+    return asyncio.run(load_test_httpx(base_url, paths, clients, duration))
+
+
+def bench_drivers(modes, port, clients, duration, students):
+    here = os.path.dirname(os.path.abspath(__file__))
+    prefix = f"load-{uuid.uuid4().hex[:8]}-"
+    seed_students(prefix, 0, students)
+    paths = [f"/students/{prefix}{i}@bench.example" for i in range(0, students, max(1, students // 1000))]
+    paths.append("/students/?limit=20")
+    report = {"clients": clients, "duration": duration}
+    try:
+        for mode in modes:
+            env = dict(os.environ, MONGO_DRIVER=mode)
+            cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+            proc = subprocess.Popen(cmd, cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                    start_new_session=True)
+            try:
+                if not wait_until_up(f"http://127.0.0.1:{port}/students/?limit=1", timeout=60):
+                    report[mode] = {"error": "server did not start"}
+                    continue
+                report[mode] = load_test(f"http://127.0.0.1:{port}", paths, clients, duration)
+                print(f"{mode}: {report[mode]}")
+            finally:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait()
+    finally:
+        cleanup_students(prefix)
+    return report
+
+
+def stats_by_key(path, key, client):
+    return {doc[key]: doc for doc in client.get(path).json()}
+
+
+# Statistics: GET /stats/* from the materialized collection vs aggregating
+# every student per request (?live=true)
+def bench_stats(students, requests):
+    client = test_client()
+    prefix = f"stats-{uuid.uuid4().hex[:8]}-"
+    seed_students(prefix, 0, students)
+    report = {"students": students, "requests": requests}
+    try:
+        started = time.perf_counter()
+        client.post("/stats/rebuild")  # seeding bypassed the API
+        report["rebuild_seconds"] = round(time.perf_counter() - started, 3)
+        for path in ("/stats/majors", "/stats/courses"):
+            for label, query in (("materialized", ""), ("live", "?live=true")):
+                samples = []
+                for _ in range(requests):
+                    timed(samples, client.get, path + query)
+                report[f"{path} {label}"] = percentiles(samples)
+                print(f"{path} {label}: {report[f'{path} {label}']}")
+        assert stats_by_key("/stats/majors", "major", client) == \
+            stats_by_key("/stats/majors?live=true", "major", client), \
+            "materialized and live major stats differ"
+
+        # Cost of the incremental maintenance on the write path
+        samples = []
+        for i in range(students, students + requests):
+            timed(samples, client.post, "/students/", json=synthetic_student(prefix, i))
+        report["add_student_with_stats"] = percentiles(samples)
+        assert stats_by_key("/stats/courses", "title", client) == \
+            stats_by_key("/stats/courses?live=true", "title", client), \
+            "incremental course stats drifted from the live aggregation"
+    finally:
+        cleanup_students(prefix)
+        client.post("/stats/rebuild")
+    return report
+
+
+# Partial updates: bytes on the wire and latency of PUT with the whole
+# document vs PATCH / course endpoints, for students with many courses
+def wire_bytes(response):
+    return len(response.request.content or b"") + len(response.content)
+
+
+def bench_partial(students, courses, requests):
+    client = test_client()
+    prefix = f"patch-{uuid.uuid4().hex[:8]}-"
+    docs = []
+    for i in range(students):
+        doc = synthetic_student(prefix, i)
+        doc["courses"] = [{"title": f"Course {n}", "credits": 1 + n % 6, "grade": GRADES[(i + n) % len(GRADES)]}
+                          for n in range(courses)]
+        docs.append(doc)
+    students_collection.insert_many([dict(doc) for doc in docs])
+    client.post("/stats/rebuild")
+    rng = random.Random(5)
+    report = {"students": students, "courses_per_student": courses, "requests": requests}
+
+    def measure(label, send):
+        samples, sizes = [], []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = send(rng.choice(docs))
+            samples.append(time.perf_counter() - started)
+            response.raise_for_status()
+            sizes.append(wire_bytes(response))
+        report[label] = dict(percentiles(samples), bytes_per_request=round(sum(sizes) / len(sizes)))
+        print(f"{label}: {report[label]}")
+
+    def put_major(doc):
+        doc["major"] = rng.choice(MAJORS)
+        return client.put(f"/students/{doc['email']}", json=doc)
+
+    def patch_major(doc):
+        doc["major"] = rng.choice(MAJORS)
+        return client.patch(f"/students/{doc['email']}", json={"major": doc["major"]})
+
+    def put_grade_full(doc):
+        doc["courses"][rng.randrange(courses)]["grade"] = rng.choice(GRADES)
+        return client.put(f"/students/{doc['email']}", json=doc)
+
+    def put_grade_positional(doc):
+        course = doc["courses"][rng.randrange(courses)]
+        course["grade"] = rng.choice(GRADES)
+        return client.put(f"/students/{doc['email']}/courses/{course['title']}/grade", json={"grade": course["grade"]})
+
+    try:
+        measure("change_major_put_full", put_major)
+        measure("change_major_patch", patch_major)
+        measure("change_grade_put_full", put_grade_full)
+        measure("change_grade_positional", put_grade_positional)
+
+        started = time.perf_counter()
+        response = client.post("/courses/Course 0/grades",
+                               json=[{"email": doc["email"], "grade": rng.choice(GRADES)} for doc in docs])
+        report["bulk_grades"] = {"students": students, "seconds": round(time.perf_counter() - started, 3),
+                                 "bytes": wire_bytes(response), "updated": response.json()["updated"]}
+
+        live = client.get("/stats/courses?live=true").json()
+        assert {c["title"]: c for c in client.get("/stats/courses").json()} == {c["title"]: c for c in live}, \
+            "course stats drifted during partial updates"
+    finally:
+        cleanup_students(prefix)
+        client.post("/stats/rebuild")
+    return report
+
+
+# Reads: CPU time per request and cache hit ratio of GET /students/{email}
+# and GET /students/ with the fast path and the student cache off and on
+READ_CONFIGS = {
+    "baseline": {"FAST_PATH": False, "STUDENT_CACHE_ENABLED": False},
+    "fast_path": {"FAST_PATH": True, "STUDENT_CACHE_ENABLED": False},
+    "cache": {"FAST_PATH": False, "STUDENT_CACHE_ENABLED": True},
+    "fast_path_cache": {"FAST_PATH": True, "STUDENT_CACHE_ENABLED": True},
+}
+
+
+def bench_reads(students, courses, requests, hot, write_every):
+    client = test_client()
+    prefix = f"read-{uuid.uuid4().hex[:8]}-"
+    docs = []
+    for i in range(students):
+        doc = synthetic_student(prefix, i)
+        doc["courses"] = [{"title": f"Course {n}", "credits": 1 + n % 6, "grade": GRADES[(i + n) % len(GRADES)]}
+                          for n in range(courses)]
+        docs.append(doc)
+    students_collection.insert_many(docs)
+    emails = [doc["email"] for doc in docs]
+    report = {"students": students, "courses_per_student": courses, "requests": requests,
+              "hot_students": hot, "orjson": app_main.orjson is not None}
+    previous = {name: getattr(app_main, name) for name in READ_CONFIGS["baseline"]}
+    try:
+        for label, config in READ_CONFIGS.items():
+            for name, value in config.items():
+                setattr(app_main, name, value)
+            app_main.student_cache = app_main.PayloadCache()
+            rng = random.Random(9)
+            samples = []
+            cpu_started = time.process_time()
+            for n in range(requests):
+                email = emails[rng.randrange(min(hot, students))]
+                if write_every and n % write_every == write_every - 1:
+                    client.patch(f"/students/{email}", json={"name": f"Renamed {n}"})
+                timed(samples, client.get, f"/students/{email}")
+            cpu = time.process_time() - cpu_started
+            page_samples = []
+            for _ in range(max(1, requests // 10)):
+                timed(page_samples, client.get, "/students/?limit=100")
+            report[label] = {
+                "get_student": percentiles(samples),
+                "cpu_ms_per_request": round(cpu / requests * 1000, 3),
+                "list_page": percentiles(page_samples),
+                "cache": app_main.student_cache.snapshot() if config["STUDENT_CACHE_ENABLED"] else None,
+            }
+            print(f"{label}: {report[label]}")
+    finally:
+        for name, value in previous.items():
+            setattr(app_main, name, value)
+        cleanup_students(prefix)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="task3 benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("listing", help="first-byte time and memory of GET /students/ as the collection grows")
+    p_list.add_argument("--sizes", default="1000,10000,100000", help="comma-separated collection sizes")
+    p_list.add_argument("--page-size", type=int, default=100)
+    p_list.add_argument("--pages", type=int, default=20, help="consecutive pages to fetch with the cursor")
+    p_list.add_argument("--batch-size", type=int, default=500)
+
+    p_idx = sub.add_parser("indexes", help="latency of the app's queries with and without the declared indexes")
+    p_idx.add_argument("--collection", default="students_bench", help="collection to seed and benchmark")
+    p_idx.add_argument("--students", type=int, default=1_000_000)
+    p_idx.add_argument("--queries", type=int, default=200, help="executions per operation")
+    p_idx.add_argument("--seed", type=int, default=42)
+
+    p_bulk = sub.add_parser("bulk", help="docs/sec of POST /students/bulk vs one POST /students/ per student")
+    p_bulk.add_argument("--students", type=int, default=50_000)
+    p_bulk.add_argument("--chunk-size", type=int, default=1000)
+    p_bulk.add_argument("--single-limit", type=int, default=5000, help="students sent one at a time")
+
+    p_drv = sub.add_parser("drivers", help="requests/sec and p99 with MONGO_DRIVER=sync vs async")
+    p_drv.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    p_drv.add_argument("--port", type=int, default=8055)
+    p_drv.add_argument("--clients", type=int, default=500, help="concurrent clients")
+    p_drv.add_argument("--duration", type=float, default=20, help="seconds of load per mode")
+    p_drv.add_argument("--students", type=int, default=10_000)
+
+    p_stats = sub.add_parser("stats", help="materialized /stats endpoints vs on-the-fly aggregation")
+    p_stats.add_argument("--students", type=int, default=100_000)
+    p_stats.add_argument("--requests", type=int, default=100)
+
+    p_patch = sub.add_parser("partial", help="bytes and latency of full-document PUT vs partial updates")
+    p_patch.add_argument("--students", type=int, default=200)
+    p_patch.add_argument("--courses", type=int, default=300, help="courses per student")
+    p_patch.add_argument("--requests", type=int, default=200)
+
+    p_reads = sub.add_parser("reads", help="CPU per request and hit ratio with the fast path / student cache")
+    p_reads.add_argument("--students", type=int, default=1000)
+    p_reads.add_argument("--courses", type=int, default=20, help="courses per student")
+    p_reads.add_argument("--requests", type=int, default=5000)
+    p_reads.add_argument("--hot", type=int, default=200, help="requests pick from the first N students")
+    p_reads.add_argument("--write-every", type=int, default=50, help="PATCH one student every N reads (0: never)")
+
+    args = parser.parse_args()
+    if args.command == "listing":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        report = bench_listing(sizes, args.page_size, args.pages, args.batch_size)
+    elif args.command == "indexes":
+        report = bench_indexes(args.collection, args.students, args.queries, args.seed)
+    elif args.command == "bulk":
+        report = bench_bulk(args.students, args.chunk_size, args.single_limit)
+    elif args.command == "drivers":
+        report = bench_drivers(args.modes, args.port, args.clients, args.duration, args.students)
+    elif args.command == "stats":
+        report = bench_stats(args.students, args.requests)
+    elif args.command == "partial":
+        report = bench_partial(args.students, args.courses, args.requests)
+    elif args.command == "reads":
+        report = bench_reads(args.students, args.courses, args.requests, args.hot, args.write_every)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
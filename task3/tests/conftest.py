@@ -0,0 +1,31 @@
+"""Run the task3 tests in-process against mongomock (MONGO_URL=mongomock://).
+
+The Mongo client is built when main is imported, so the URL is set here,
+before any test module imports the app. Needs fastapi, mongomock and httpx.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+os.environ["MONGO_URL"] = "mongomock://"
+os.environ.setdefault("MONGO_DRIVER", "sync")
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def prefix():
+    return f"t-{uuid.uuid4().hex[:8]}-"
@@ -0,0 +1,44 @@
+def course_stats(client, title, live=False):
+    stats = client.get(f"/stats/courses{'?live=true' if live else ''}").json()
+    return next((course for course in stats if course["title"] == title), None)
+
+
+def add_student(client, email, title, grade="A"):
+    response = client.post("/students/", json={"name": "Test", "email": email, "major": "Testing",
+                                               "courses": [{"title": title, "credits": 3, "grade": grade}]})
+    assert response.status_code == 200, response.text
+
+
+def test_course_grades_with_a_repeated_email_keep_the_last_grade(client, prefix):
+    title, email, other = f"{prefix}course", f"{prefix}a@test.example", f"{prefix}b@test.example"
+    add_student(client, email, title)
+    add_student(client, other, title)
+
+    response = client.post(f"/courses/{title}/grades", json=[
+        {"email": email, "grade": "B"}, {"email": other, "grade": "B"}, {"email": email, "grade": "C"}])
+
+    assert response.json() == {"updated": 2, "results": [
+        {"email": email, "status": "superseded", "reason": "replaced by entry 2"},
+        {"email": other, "status": "updated"},
+        {"email": email, "status": "updated"},
+    ]}
+    assert client.get(f"/students/{email}").json()["courses"][0]["grade"] == "C"
+    assert course_stats(client, title)["grades"] == {"B": 1, "C": 1}
+    assert course_stats(client, title) == course_stats(client, title, live=True)
+
+
+
+def test_bulk_write_without_acknowledgement_is_rejected(client, prefix):
+    title, email = f"{prefix}course", f"{prefix}a@test.example"
+    document = {"name": "Test", "email": email, "major": "Testing",
+                "courses": [{"title": title, "credits": 3, "grade": "A"}]}
+
+    for query in ("w=0", "w=0&j=true"):
+        response = client.post(f"/students/bulk?{query}", json=[document])
+        assert response.status_code == 400, response.text
+    assert client.get(f"/students/{email}").status_code == 404
+    assert course_stats(client, title) is None
+
+    response = client.post("/students/bulk?w=1", json=[document])
+    assert response.json()["summary"]["inserted"] == 1
+    assert course_stats(client, title) == course_stats(client, title, live=True)
@@ -0,0 +1,160 @@
+import argparse
+import json
+import time
+
+from opensearchpy.exceptions import TransportError
+
+from fake_bulk import FakeBulkServer
+from simulator import (INDEX_NAME, CPU_BASE, CPU_ANOMALY, ANOMALY_PROBABILITY, ANOMALY_DURATION, DELTA_PERCENT,
+                       generate_data, make_client, make_sink, create_index)
+from ingest import BulkIngester
+
+
+# Ingest: docs/sec and ingest lag of one client.index per doc vs the buffered
+# BulkIngester, against the local fake _bulk endpoint with injected latency/failures
+def drive(send, docs):
+    started = time.perf_counter()
+    for _ in range(docs):
+        send(generate_data(CPU_BASE, False))
+    return time.perf_counter() - started
+
+
+def bench_ingest(docs, index_docs, latency_ms, fail_rate, unavailable_rate, batch_size, flush_interval, queue_size):
+    report = {"docs": docs, "index_docs": index_docs, "latency_ms": latency_ms, "fail_rate": fail_rate,
+              "unavailable_rate": unavailable_rate}
+
+    server = FakeBulkServer(latency_ms=latency_ms, fail_rate=fail_rate, unavailable_rate=unavailable_rate,
+                            seed=1).start()
+    try:
+        client = make_client(host="127.0.0.1", port=server.port, use_ssl=False)
+        create_index(client)
+        index_send, _ = make_sink(client, "index")
+        failures = 0
+
+        def send_one(data):
+            nonlocal failures
+            try:
+                index_send(data)
+            except TransportError:
+                failures += 1
+
+        elapsed = drive(send_one, index_docs)
+        server_stats = server.snapshot()
+        report["index"] = {"seconds": round(elapsed, 3), "docs_per_sec": round(index_docs / elapsed, 1),
+                           "failed": failures, "server": server_stats}
+        print(f"index: {report['index']}")
+        assert server_stats["overwritten"] == 0, server_stats
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    server = FakeBulkServer(latency_ms=latency_ms, fail_rate=fail_rate, unavailable_rate=unavailable_rate,
+                            seed=1).start()
+    try:
+        client = make_client(host="127.0.0.1", port=server.port, use_ssl=False)
+        create_index(client)
+        # Through make_sink, so the benchmark uses the simulator's document ids
+        send, ingester = make_sink(client, "bulk", batch_size=batch_size, flush_interval=flush_interval,
+                                   queue_size=queue_size, backoff_base=0.01)
+        generated = drive(send, docs)
+        ingester.close()
+        stats = ingester.snapshot()
+        server_stats = server.snapshot()
+        report["bulk"] = {"generate_seconds": round(generated, 3), "ingester": stats, "server": server_stats}
+        print(f"bulk: {report['bulk']}")
+        assert stats["submitted"] == docs, stats
+        assert stats["indexed"] + stats["failed"] == docs, stats
+        assert server_stats["overwritten"] == 0 and server_stats["docs"] == stats["indexed"], (server_stats, stats)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+# Fleet: one-core docs/sec of the vectorized multi-host generator, alone and
+# through the bulk ingester, plus checks on seeding, ids and anomaly rates
+def make_fleet(hosts, seed):
+    try:
+        from fleet import Fleet
+    except ImportError:
+        raise SystemExit("Fleet mode needs numpy: pip install numpy")
+    return Fleet(hosts, ANOMALY_PROBABILITY, ANOMALY_DURATION, CPU_BASE, CPU_ANOMALY, DELTA_PERCENT, seed=seed)
+
+
+def bench_fleet(hosts, duration, rate, seed):
+    from fleet import run_fleet
+
+    report = {"hosts": hosts, "duration_s": duration, "rate": rate, "seed": seed}
+
+    first, second = make_fleet(hosts, seed), make_fleet(hosts, seed)
+    for _ in range(100):
+        (usage_a, anomaly_a), (usage_b, anomaly_b) = first.tick(), second.tick()
+        assert (usage_a == usage_b).all() and (anomaly_a == anomaly_b).all(), "same seed, different samples"
+
+    # Long-run share of anomalous samples per host: D*p / (1 + D*p - p)
+    fleet = make_fleet(hosts, seed)
+    ticks = max(1, 1_000_000 // hosts)
+    anomalous = sum(int(fleet.tick()[1].sum()) for _ in range(ticks))
+    p, d = ANOMALY_PROBABILITY, ANOMALY_DURATION
+    report["anomaly_share"] = {"observed": round(anomalous / (ticks * hosts), 4),
+                               "expected": round(d * p / (1 + d * p - p), 4)}
+    print(f"anomaly share: {report['anomaly_share']}")
+
+    fleet = make_fleet(hosts, seed)
+    started = time.perf_counter()
+    generated = run_fleet(fleet, lambda payload, count: None, "gen", rate, duration)
+    elapsed = time.perf_counter() - started
+    report["generate_only"] = {"docs": generated, "docs_per_sec": round(generated / elapsed, 1)}
+    print(f"generate only: {report['generate_only']}")
+
+    server = FakeBulkServer().start()
+    try:
+        client = make_client(host="127.0.0.1", port=server.port, use_ssl=False)
+        create_index(client, "ms")
+        ingester = BulkIngester(client, INDEX_NAME)
+        generated = run_fleet(make_fleet(hosts, seed), ingester.submit_ndjson, "bench", rate, duration)
+        ingester.close()
+        stats = ingester.snapshot()
+        server_stats = server.snapshot()
+        report["bulk"] = {"generated": generated, "docs_per_sec": round(generated / stats["elapsed_s"], 1),
+                          "ingester": stats, "server": server_stats}
+        print(f"bulk: {report['bulk']}")
+        assert stats["indexed"] == generated, stats
+        assert server_stats["overwritten"] == 0 and server_stats["docs"] == generated, server_stats
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="task4 benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="docs/sec and lag of per-doc index calls vs the bulk ingester")
+    p_ingest.add_argument("--docs", type=int, default=200_000, help="docs sent through the bulk ingester")
+    p_ingest.add_argument("--index-docs", type=int, default=2000, help="docs sent one client.index call at a time")
+    p_ingest.add_argument("--latency-ms", type=float, default=2.0, help="fake server latency per request")
+    p_ingest.add_argument("--fail-rate", type=float, default=0.01, help="fraction of bulk items rejected with 429")
+    p_ingest.add_argument("--unavailable-rate", type=float, default=0.01, help="fraction of requests failing with 503")
+    p_ingest.add_argument("--batch-size", type=int, default=1000)
+    p_ingest.add_argument("--flush-interval", type=float, default=1.0)
+    p_ingest.add_argument("--queue-size", type=int, default=10_000)
+
+    p_fleet = sub.add_parser("fleet", help="docs/sec of the multi-host generator, with seed/id/anomaly checks")
+    p_fleet.add_argument("--hosts", type=int, default=1000)
+    p_fleet.add_argument("--duration", type=float, default=10, help="seconds per run")
+    p_fleet.add_argument("--rate", type=float, default=0, help="docs/sec in total (0: as fast as possible)")
+    p_fleet.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        report = bench_ingest(args.docs, args.index_docs, args.latency_ms, args.fail_rate, args.unavailable_rate,
+                              args.batch_size, args.flush_interval, args.queue_size)
+    elif args.command == "fleet":
+        report = bench_fleet(args.hosts, args.duration, args.rate, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
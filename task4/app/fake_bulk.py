@@ -0,0 +1,166 @@
+"""Local stand-in for the OpenSearch endpoints the simulator uses.
+
+    python fake_bulk.py --port 9201 --fail-rate 0.05 --latency-ms 5
+    OPENSEARCH_HOST=localhost OPENSEARCH_PORT=9201 OPENSEARCH_SSL=0 STARTUP_DELAY=0 python simulator.py
+
+Answers index create/delete, single-document index and _bulk requests over
+plain HTTP without storing anything but the document ids. Item rejections
+(429) and whole-request 503s can be injected into document writes to exercise retries.
+GET /_fake/stats returns the counters (docs created, overwritten ids, ...).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBulkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, fail_rate=0.0, unavailable_rate=0.0, seed=None):
+        super().__init__((host, port), FakeBulkHandler)
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.unavailable_rate = unavailable_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = {}  # index -> set of document ids
+        self.stats = {"requests": 0, "bulk_requests": 0, "created": 0, "overwritten": 0,
+                      "rejected_items": 0, "unavailable": 0}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve from a daemon thread; returns self"""
+        threading.Thread(target=self.serve_forever, name="fake-bulk", daemon=True).start()
+        return self
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, docs=sum(len(ids) for ids in self.ids.values()))
+
+    def store(self, index, doc_id):
+        """Record one write; returns the item status and result"""
+        with self.lock:
+            if self.fail_rate and self.random.random() < self.fail_rate:
+                self.stats["rejected_items"] += 1
+                return 429, None
+            ids = self.ids.setdefault(index, set())
+            if doc_id in ids:
+                self.stats["overwritten"] += 1
+                return 200, "updated"
+            ids.add(doc_id)
+            self.stats["created"] += 1
+            return 201, "created"
+
+
+class FakeBulkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def dispatch(self):
+        server = self.server
+        body = self.read_body()
+        parts = [part for part in self.path.split("?", 1)[0].split("/") if part]
+        if parts == ["_fake", "stats"]:
+            return self.send_json(200, server.snapshot())
+        if not parts:
+            return self.send_json(200, {"name": "fake-bulk", "version": {"distribution": "opensearch",
+                                                                        "number": "2.0.0"}})
+        is_write = parts[-1] == "_bulk" or (len(parts) >= 2 and parts[1] in ("_doc", "_create"))
+        with server.lock:
+            server.stats["requests"] += 1
+            unavailable = is_write and server.unavailable_rate and server.random.random() < server.unavailable_rate
+            if unavailable:
+                server.stats["unavailable"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if unavailable:
+            return self.send_json(503, {"error": {"type": "unavailable", "reason": "injected"}, "status": 503})
+        if parts[-1] == "_bulk":
+            return self.send_json(200, self.bulk(parts[0] if len(parts) == 2 else None, body))
+        if len(parts) >= 2 and parts[1] in ("_doc", "_create") and self.command in ("PUT", "POST"):
+            doc_id = parts[2] if len(parts) == 3 else uuid.uuid4().hex
+            status, result = server.store(parts[0], doc_id)
+            if result is None:
+                return self.send_json(429, {"error": {"type": "es_rejected_execution_exception",
+                                                      "reason": "injected"}, "status": 429})
+            return self.send_json(status, {"_index": parts[0], "_id": doc_id, "result": result})
+        if len(parts) == 1 and self.command == "PUT":
+            with server.lock:
+                server.ids[parts[0]] = set()
+            return self.send_json(200, {"acknowledged": True, "index": parts[0]})
+        if len(parts) == 1 and self.command == "DELETE":
+            with server.lock:
+                found = server.ids.pop(parts[0], None) is not None
+            if not found:
+                return self.send_json(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+            return self.send_json(200, {"acknowledged": True})
+        if len(parts) == 1 and self.command in ("GET", "HEAD"):
+            with server.lock:
+                found = parts[0] in server.ids
+            return self.send_json(200 if found else 404, {})
+        return self.send_json(400, {"error": {"type": "unsupported", "reason": self.path}, "status": 400})
+
+    def bulk(self, default_index, body):
+        lines = [line for line in body.decode().split("\n") if line.strip()]
+        with self.server.lock:
+            self.server.stats["bulk_requests"] += 1
+        items, errors, position = [], False, 0
+        while position < len(lines):
+            (op, meta), = json.loads(lines[position]).items()
+            position += 1 if op == "delete" else 2
+            index = meta.get("_index", default_index)
+            doc_id = meta.get("_id") or uuid.uuid4().hex
+            status, result = self.server.store(index, doc_id)
+            if result is None:
+                errors = True
+                items.append({op: {"_index": index, "_id": doc_id, "status": 429, "error": {
+                    "type": "es_rejected_execution_exception", "reason": "injected"}}})
+            else:
+                items.append({op: {"_index": index, "_id": doc_id, "result": result, "status": status}})
+        return {"took": 1, "errors": errors, "items": items}
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = dispatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake OpenSearch _bulk endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9201)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of items rejected with 429")
+    parser.add_argument("--unavailable-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    args = parser.parse_args()
+    server = FakeBulkServer(args.host, args.port, args.latency_ms, args.fail_rate, args.unavailable_rate)
+    print(f"Fake _bulk endpoint on http://{args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Load generation for a fleet of simulated hosts.
+
+    python simulator.py --hosts 1000 --rate 50000 --duration 60 --seed 7
+
+Every tick produces one sample per host. Each host runs the anomaly state
+machine of the single-series simulator: a host that is not in an anomaly
+starts one with probability ANOMALY_PROBABILITY and then reports around
+CPU_ANOMALY for ANOMALY_DURATION samples, otherwise around CPU_BASE, with
++-DELTA_PERCENT uniform noise. The state and the noise are numpy arrays
+updated once per tick, and a tick is serialized straight into _bulk NDJSON
+and queued as one unit.
+
+Document ids are "<run id>-<host>-<tick>", unique within a run; reusing a
+run id with the same seed rewrites the same documents.
+"""
+import time
+
+import numpy as np
+
+
+class Fleet:
+    """Per-host anomaly state machines, advanced together"""
+
+    def __init__(self, hosts, anomaly_probability, anomaly_duration, cpu_base, cpu_anomaly, delta_percent,
+                 seed=None, host_prefix="host-"):
+        self.hosts = hosts
+        self.anomaly_probability = anomaly_probability
+        self.anomaly_duration = anomaly_duration
+        self.cpu_base = cpu_base
+        self.cpu_anomaly = cpu_anomaly
+        self.delta_percent = delta_percent
+        self.rng = np.random.default_rng(seed)
+        self.names = [f"{host_prefix}{i:05d}" for i in range(hosts)]
+        self.remaining = np.zeros(hosts, dtype=np.int64)  # anomalous samples left per host
+        self.ticks = 0
+        self.anomalies_started = 0
+
+    def tick(self):
+        """cpu_usage and anomaly arrays for the next sample of every host"""
+        starting = (self.remaining == 0) & (self.rng.random(self.hosts) < self.anomaly_probability)
+        self.remaining[starting] = self.anomaly_duration
+        anomaly = self.remaining > 0
+        base = np.where(anomaly, self.cpu_anomaly, self.cpu_base)
+        usage = base * (1 + self.rng.uniform(-self.delta_percent, self.delta_percent, self.hosts) / 100)
+        self.remaining[anomaly] -= 1
+        self.anomalies_started += int(starting.sum())
+        self.ticks += 1
+        return usage, anomaly
+
+    def tick_ndjson(self, timestamp, run_id):
+        """_bulk "index" action/source pairs for the next tick, all stamped `timestamp`"""
+        tick = self.ticks
+        usage, anomaly = self.tick()
+        return "".join(
+            f'{{"index":{{"_id":"{run_id}-{i}-{tick}"}}}}\n'
+            f'{{"name":"CPU_usage","host":"{name}","timestamp":{timestamp},'
+            f'"cpu_usage":{value:.3f},"anomaly":{flag}}}\n'
+            for i, (name, value, flag) in enumerate(zip(self.names, usage.tolist(), anomaly.view(np.int8).tolist()))
+        )
+
+
+def run_fleet(fleet, submit, run_id, rate=0.0, duration=0.0, timestamp_unit="ms", report=None, report_interval=10):
+    """Generate ticks at `rate` docs/sec in total (0: as fast as possible) for `duration` seconds (0: until
+    stopped), passing (ndjson, doc count) to `submit`; returns the number of docs generated"""
+    interval = fleet.hosts / rate if rate else 0.0
+    scale = 1000 if timestamp_unit == "ms" else 1
+    sent = 0
+    started = next_tick = next_report = time.monotonic()
+    try:
+        while not duration or time.monotonic() - started < duration:
+            submit(fleet.tick_ndjson(int(time.time() * scale), run_id), fleet.hosts)
+            sent += fleet.hosts
+            now = time.monotonic()
+            if report and report_interval and now >= next_report:
+                next_report = now + report_interval
+                report(sent, started)
+            if interval:
+                next_tick += interval
+                if next_tick > now:
+                    time.sleep(next_tick - now)
+                elif now - next_tick > 1.0:
+                    # More than a second behind: run at full speed from here instead of bursting later
+                    next_tick = now
+    except KeyboardInterrupt:
+        print("Stopping simulator...")
+    return sent
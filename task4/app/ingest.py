@@ -0,0 +1,245 @@
+"""Buffered _bulk ingestion for the simulator.
+
+    ingester = BulkIngester(client, INDEX_NAME)
+    ingester.submit(doc, doc_id="...")   # returns once the doc is queued
+    ingester.close()                     # flushes everything still queued
+
+Documents are queued and sent by one background thread through the _bulk
+API whenever BULK_SIZE docs, BULK_MAX_BYTES of payload or BULK_FLUSH_INTERVAL
+seconds since the oldest buffered doc is reached, whichever comes first.
+Items rejected with 429 or 5xx, and whole requests that fail with a
+connection error or 429/502/503/504, are retried with exponential backoff
+and jitter up to BULK_MAX_RETRIES times; other item errors (mapping errors
+etc.) are counted as failed and not retried. While the worker is sending or
+backing off, the queue (BULK_QUEUE_SIZE docs) fills up and submit()
+blocks, which slows the producer down to what the cluster accepts.
+
+High-rate producers can hand over pre-serialized NDJSON with
+submit_ndjson(); such a chunk is queued, batched and acknowledged as one
+unit, and only the rejected docs inside it are retried.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from opensearchpy.exceptions import ConnectionError as TransportConnectionError, TransportError
+
+BULK_SIZE = int(os.environ.get("BULK_SIZE", 1000))
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", 5 * 1024 * 1024))
+BULK_FLUSH_INTERVAL = float(os.environ.get("BULK_FLUSH_INTERVAL", 1.0))
+BULK_QUEUE_SIZE = int(os.environ.get("BULK_QUEUE_SIZE", 10_000))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", 5))
+BULK_BACKOFF_BASE = float(os.environ.get("BULK_BACKOFF_BASE", 0.1))
+BULK_BACKOFF_MAX = float(os.environ.get("BULK_BACKOFF_MAX", 10.0))
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+LAG_SAMPLES = 10_000
+
+logger = logging.getLogger("simulator.ingest")
+
+_STOP = object()
+
+
+def is_retryable_status(status):
+    return status == 429 or status >= 500
+
+
+def is_retryable_error(error):
+    if isinstance(error, TransportConnectionError):
+        return True
+    return isinstance(error, TransportError) and error.status_code in RETRYABLE_STATUSES
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class BulkIngester:
+    """Queue of documents drained into `index` by a background _bulk sender"""
+
+    def __init__(self, client, index, batch_size=BULK_SIZE, max_bytes=BULK_MAX_BYTES,
+                 flush_interval=BULK_FLUSH_INTERVAL, queue_size=BULK_QUEUE_SIZE,
+                 max_retries=BULK_MAX_RETRIES, backoff_base=BULK_BACKOFF_BASE, backoff_max=BULK_BACKOFF_MAX):
+        self.client = client
+        self.index = index
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_size = queue_size
+        self._queue = queue.Queue()
+        self._queued_docs = 0
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._closed = False
+        self._lags = deque(maxlen=LAG_SAMPLES)  # seconds from submit() to acknowledgement
+        self.started = time.monotonic()
+        self.stats = {"submitted": 0, "indexed": 0, "failed": 0, "retried": 0, "bulk_requests": 0,
+                      "request_errors": 0, "bytes_sent": 0, "blocked_submits": 0, "blocked_seconds": 0.0}
+        self.last_error = None
+        self._worker = threading.Thread(target=self._run, name="bulk-ingester", daemon=True)
+        self._worker.start()
+
+    def submit(self, doc, doc_id=None, timeout=None):
+        """Queue one document; blocks while the queue is full (queue.Full after `timeout` seconds)"""
+        action = {"index": {"_id": str(doc_id)}} if doc_id is not None else {"index": {}}
+        self.submit_ndjson(f"{json.dumps(action)}\n{json.dumps(doc)}\n", 1, timeout)
+
+    def submit_ndjson(self, payload, count, timeout=None):
+        """Queue `count` "index" action/source line pairs, newline-terminated, as one unit"""
+        if self._closed:
+            raise RuntimeError("ingester is closed")
+        if not self._worker.is_alive():
+            raise RuntimeError("bulk worker stopped") from self.last_error
+        with self._space:
+            # A chunk larger than the whole queue still goes through once the queue is empty
+            if self._queued_docs and self._queued_docs + count > self.queue_size:
+                blocked_since = time.monotonic()
+                has_space = self._space.wait_for(
+                    lambda: not self._queued_docs or self._queued_docs + count <= self.queue_size, timeout)
+                self.stats["blocked_submits"] += 1
+                self.stats["blocked_seconds"] += time.monotonic() - blocked_since
+                if not has_space:
+                    raise queue.Full
+            self._queued_docs += count
+            self.stats["submitted"] += count
+        self._queue.put((time.monotonic(), payload, count))
+
+    def flush(self, timeout=None):
+        """Send everything submitted so far and wait for it to be acknowledged"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting documents, send what is queued and stop the worker"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        batch, batch_docs, batch_bytes, deadline = [], 0, 0, None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # the oldest buffered doc reached flush_interval
+            if item is _STOP or isinstance(item, threading.Event):
+                if batch:
+                    self._send(batch)
+                    batch, batch_docs, batch_bytes = [], 0, 0
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+            if item is not None:
+                with self._space:
+                    self._queued_docs -= item[2]
+                    self._space.notify_all()
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                batch_docs += item[2]
+                batch_bytes += len(item[1])
+            if batch and (batch_docs >= self.batch_size or batch_bytes >= self.max_bytes
+                          or time.monotonic() >= deadline):
+                self._send(batch)
+                batch, batch_docs, batch_bytes = [], 0, 0
+
+    def _send(self, batch):
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                with self._lock:
+                    self.stats["retried"] += sum(item[2] for item in pending)
+            pending = self._send_once(pending)
+            if not pending:
+                return
+        dropped = sum(item[2] for item in pending)
+        logger.error("Dropping %d docs after %d retries: %s", dropped, self.max_retries, self.last_error)
+        with self._lock:
+            self.stats["failed"] += dropped
+
+    def _send_once(self, pending):
+        """One _bulk request; returns the items worth retrying"""
+        body = "".join(item[1] for item in pending)
+        with self._lock:
+            self.stats["bulk_requests"] += 1
+            self.stats["bytes_sent"] += len(body)
+        try:
+            response = self.client.bulk(body=body, index=self.index)
+        except Exception as e:
+            self.last_error = e
+            with self._lock:
+                self.stats["request_errors"] += 1
+            if is_retryable_error(e):
+                logger.warning("Bulk request failed, will retry: %s", e)
+                return pending
+            dropped = sum(item[2] for item in pending)
+            logger.error("Bulk request failed, dropping %d docs: %s", dropped, e)
+            with self._lock:
+                self.stats["failed"] += dropped
+            return []
+
+        acknowledged = time.monotonic()
+        retry, indexed, failed, position = [], 0, 0, 0
+        for enqueued, payload, count in pending:
+            rejected = []
+            for k, result in enumerate(response["items"][position:position + count]):
+                outcome = next(iter(result.values()))
+                status = outcome.get("status", 500)
+                if status < 300:
+                    indexed += 1
+                elif is_retryable_status(status):
+                    rejected.append(k)
+                else:
+                    failed += 1
+                    self.last_error = outcome.get("error")
+            position += count
+            if len(rejected) < count:
+                self._lags.append(acknowledged - enqueued)
+            if rejected:
+                # Every action has a source line, so doc k is lines 2k and 2k+1
+                lines = payload.split("\n")
+                retry.append((enqueued, "".join(f"{lines[2 * k]}\n{lines[2 * k + 1]}\n" for k in rejected),
+                              len(rejected)))
+        if failed:
+            logger.error("%d docs rejected by the index: %s", failed, self.last_error)
+        with self._lock:
+            self.stats["indexed"] += indexed
+            self.stats["failed"] += failed
+        return retry
+
+    def snapshot(self):
+        """Counters plus throughput and ingest lag (submit to acknowledgement)"""
+        with self._lock:
+            stats = dict(self.stats, queued=self._queued_docs)
+            lags = sorted(self._lags)
+        elapsed = time.monotonic() - self.started
+        stats["elapsed_s"] = round(elapsed, 3)
+        stats["docs_per_sec"] = round(stats["indexed"] / elapsed, 1) if elapsed else None
+        stats["blocked_seconds"] = round(stats["blocked_seconds"], 3)
+        stats["lag_ms"] = {name: round(percentile(lags, q) * 1000, 1) if lags else None
+                           for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+        stats["lag_ms"]["max"] = round(lags[-1] * 1000, 1) if lags else None
+        return stats
@@ -69,7 +69,8 @@ def get_avg_cpu_last_minute():
             "range": {
                 "timestamp": {
                     "gte": int(one_min_ago.timestamp()),
-                    "lte": int(now.timestamp())
+                    "lte": int(now.timestamp()),
+                    "format": "epoch_second"  # the mapping may store epoch_millis
                 }
             }
         },
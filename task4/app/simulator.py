@@ -1,40 +1,60 @@
 from opensearchpy import OpenSearch
+import argparse
+import copy
+import itertools
+import os
+import signal
+import socket
+import sys
 import time
 import random
+import uuid
 
-
-print("Starting CPU data simulator...")
-time.sleep(30)  # Allow OpenSearch to initialize
+from ingest import BulkIngester
 
 
 # --- Configuration ---
-OPENSEARCH_HOST = "oe-cont"
-OPENSEARCH_PORT = 9200
-AUTH = ("admin", "QWERTYadmin123!@#")
-INDEX_NAME = "cpu-index"
-TELEMETRY_INTERVAL = 1
+OPENSEARCH_HOST = os.environ.get("OPENSEARCH_HOST", "oe-cont")
+OPENSEARCH_PORT = int(os.environ.get("OPENSEARCH_PORT", 9200))
+OPENSEARCH_SSL = os.environ.get("OPENSEARCH_SSL", "1") == "1"
+AUTH = (os.environ.get("OPENSEARCH_USER", "admin"), os.environ.get("OPENSEARCH_PASSWORD", "QWERTYadmin123!@#"))
+INDEX_NAME = os.environ.get("INDEX_NAME", "cpu-index")
+STARTUP_DELAY = float(os.environ.get("STARTUP_DELAY", 30))  # Allow OpenSearch to initialize
+TELEMETRY_INTERVAL = float(os.environ.get("TELEMETRY_INTERVAL", 1))
 ANOMALY_PROBABILITY = 0.02
 ANOMALY_DURATION = 30
 CPU_BASE = 20
 CPU_ANOMALY = 80
 DELTA_PERCENT = 20
 
+# bulk: buffered _bulk requests from a background thread (see ingest.py)
+# index: one blocking client.index call per sample
+INGEST_MODE = os.environ.get("INGEST_MODE", "bulk")
+PRINT_DOCS = os.environ.get("PRINT_DOCS", "1") == "1"
+STATS_INTERVAL = float(os.environ.get("STATS_INTERVAL", 10))
+MAX_DOCS = int(os.environ.get("MAX_DOCS", 0))  # 0: run until stopped
+HOST_NAME = os.environ.get("HOST_NAME") or socket.gethostname()
+TIMESTAMP_UNIT = os.environ.get("TIMESTAMP_UNIT", "s")  # s | ms
+TIMESTAMP_FORMATS = {"s": "epoch_second", "ms": "epoch_millis"}
+
 
 # --- OpenSearch Setup ---
-client = OpenSearch(
-    hosts=[{"host": OPENSEARCH_HOST, "port": OPENSEARCH_PORT}],
-    http_auth=AUTH,
-    use_ssl=True,
-    verify_certs=False,
-    ssl_assert_hostname=False,
-    ssl_show_warn=False,
-)
+def make_client(host=OPENSEARCH_HOST, port=OPENSEARCH_PORT, use_ssl=OPENSEARCH_SSL):
+    return OpenSearch(
+        hosts=[{"host": host, "port": port}],
+        http_auth=AUTH,
+        use_ssl=use_ssl,
+        verify_certs=False,
+        ssl_assert_hostname=False,
+        ssl_show_warn=False,
+    )
 
 
 index_mapping = {
     "mappings": {
         "properties": {
             "name": {"type": "text"},
+            "host": {"type": "keyword"},
             "timestamp": {"type": "date", "format": "epoch_second"},
             "cpu_usage": {"type": "float"},
             "anomaly": {"type": "integer"}
@@ -43,35 +63,151 @@ index_mapping = {
 }
 
 
-client.indices.delete(index=INDEX_NAME, ignore=[404])
-client.indices.create(index=INDEX_NAME, body=index_mapping)
+def create_index(client, timestamp_unit=TIMESTAMP_UNIT):
+    mapping = copy.deepcopy(index_mapping)
+    mapping["mappings"]["properties"]["timestamp"]["format"] = TIMESTAMP_FORMATS[timestamp_unit]
+    client.indices.delete(index=INDEX_NAME, ignore=[404])
+    client.indices.create(index=INDEX_NAME, body=mapping)
 
 
 # --- Simulation Logic ---
-def generate_data(cpu_base, is_anomaly):
-    timestamp = int(time.time())
+def generate_data(cpu_base, is_anomaly, timestamp_unit=TIMESTAMP_UNIT):
+    timestamp = int(time.time() * 1000) if timestamp_unit == "ms" else int(time.time())
     variation = cpu_base * random.uniform(-DELTA_PERCENT, DELTA_PERCENT) / 100
     usage = cpu_base + variation
     return {
         "name": "CPU_usage",
+        "host": HOST_NAME,
         "timestamp": timestamp,
         "cpu_usage": usage,
         "anomaly": int(is_anomaly)
     }
 
 
-def send_data(cpu_base, is_anomaly):
-    data = generate_data(cpu_base, is_anomaly)
-    print(data)
-    client.index(index=INDEX_NAME, id=data["timestamp"], body=data)
-    time.sleep(TELEMETRY_INTERVAL)
+def samples():
+    """(cpu_base, is_anomaly) for every sample, anomalies lasting ANOMALY_DURATION samples"""
+    while True:
+        if random.random() < ANOMALY_PROBABILITY:
+            print("Anomaly detected")
+            for _ in range(ANOMALY_DURATION):
+                yield CPU_ANOMALY, True
+        else:
+            yield CPU_BASE, False
+
+
+def make_sink(client, mode=INGEST_MODE, run_id=None, **ingester_options):
+    """send(data) for the ingest mode, and the BulkIngester behind it (None for index), built with
+    `ingester_options`. Documents get ids "<run id>-<n>", so samples within the same second do not
+    overwrite each other."""
+    run_id = run_id or uuid.uuid4().hex[:8]
+    sequence = itertools.count()
+    if mode == "index":
+        def send(data):
+            client.index(index=INDEX_NAME, id=f"{run_id}-{next(sequence)}", body=data)
+        return send, None
+    if mode == "bulk":
+        ingester = BulkIngester(client, INDEX_NAME, **ingester_options)
+
+        def send(data):
+            ingester.submit(data, doc_id=f"{run_id}-{next(sequence)}")
+        return send, ingester
+    raise SystemExit(f"INGEST_MODE must be 'bulk' or 'index', got {mode!r}")
+
+
+def run(send, ingester=None, max_docs=MAX_DOCS, duration=0.0, timestamp_unit=TIMESTAMP_UNIT):
+    sent = 0
+    started = next_report = time.monotonic()
+    try:
+        for cpu_base, is_anomaly in samples():
+            if duration and time.monotonic() - started >= duration:
+                break
+            data = generate_data(cpu_base, is_anomaly, timestamp_unit)
+            if PRINT_DOCS:
+                print(data)
+            send(data)
+            sent += 1
+            if max_docs and sent >= max_docs:
+                break
+            if STATS_INTERVAL and time.monotonic() >= next_report:
+                next_report = time.monotonic() + STATS_INTERVAL
+                print_stats(sent, started, ingester)
+            if TELEMETRY_INTERVAL:
+                time.sleep(TELEMETRY_INTERVAL)
+    except KeyboardInterrupt:
+        print("Stopping simulator...")
+    return sent
+
+
+def print_stats(sent, started, ingester=None):
+    elapsed = time.monotonic() - started
+    line = f"generated={sent} ({sent / elapsed:.1f}/s)" if elapsed else f"generated={sent}"
+    if ingester is not None:
+        stats = ingester.snapshot()
+        line += (f" indexed={stats['indexed']} ({stats['docs_per_sec']}/s) failed={stats['failed']}"
+                 f" retried={stats['retried']} queued={stats['queued']} lag_ms={stats['lag_ms']}")
+    print(line)
+
+
+def stop(signum, frame):
+    # docker stop sends SIGTERM; turn it into KeyboardInterrupt so the queue is flushed
+    raise KeyboardInterrupt
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CPU telemetry simulator")
+    parser.add_argument("--hosts", type=int, default=0,
+                        help="simulate a fleet of N hosts (default: the single CPU_usage series)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="fleet docs/sec in total, 0 for as fast as possible "
+                             "(default: one sample per host every TELEMETRY_INTERVAL)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (default: until stopped)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible samples")
+    parser.add_argument("--timestamp-unit", choices=sorted(TIMESTAMP_FORMATS), default=None,
+                        help="default: ms for a fleet, TIMESTAMP_UNIT otherwise")
+    parser.add_argument("--run-id", default=None, help="document id prefix (default: random per run)")
+    return parser.parse_args(argv)
+
+
+def run_fleet_mode(client, args, timestamp_unit, run_id):
+    try:
+        from fleet import Fleet, run_fleet
+    except ImportError:
+        raise SystemExit("Fleet mode needs numpy: pip install numpy")
+    if INGEST_MODE != "bulk":
+        raise SystemExit("Fleet mode sends through the bulk ingester; unset INGEST_MODE")
+    rate = args.rate if args.rate is not None else (args.hosts / TELEMETRY_INTERVAL if TELEMETRY_INTERVAL else 0)
+    fleet = Fleet(args.hosts, ANOMALY_PROBABILITY, ANOMALY_DURATION, CPU_BASE, CPU_ANOMALY, DELTA_PERCENT,
+                  seed=args.seed)
+    ingester = BulkIngester(client, INDEX_NAME)
+    print(f"Simulating {args.hosts} hosts at {rate or 'max'} docs/sec, run id {run_id}")
+    sent = run_fleet(fleet, ingester.submit_ndjson, run_id, rate, args.duration, timestamp_unit,
+                     report=lambda sent, started: print_stats(sent, started, ingester), report_interval=STATS_INTERVAL)
+    return sent, ingester
 
 
 # --- Main Loop ---
-while True:
-    if random.random() < ANOMALY_PROBABILITY:
-        print("Anomaly detected")
-        for _ in range(ANOMALY_DURATION):
-            send_data(CPU_ANOMALY, True)
+def main(argv=None):
+    args = parse_args(argv)
+    timestamp_unit = args.timestamp_unit or ("ms" if args.hosts else TIMESTAMP_UNIT)
+    run_id = args.run_id or uuid.uuid4().hex[:8]
+    if args.seed is not None:
+        random.seed(args.seed)
+    print("Starting CPU data simulator...")
+    time.sleep(STARTUP_DELAY)
+    signal.signal(signal.SIGTERM, stop)
+    client = make_client()
+    create_index(client, timestamp_unit)
+    started = time.monotonic()
+    if args.hosts:
+        sent, ingester = run_fleet_mode(client, args, timestamp_unit, run_id)
     else:
-        send_data(CPU_BASE, False)
+        send, ingester = make_sink(client, run_id=run_id)
+        sent = run(send, ingester, duration=args.duration, timestamp_unit=timestamp_unit)
+    if ingester is not None:
+        ingester.close()
+    print_stats(sent, started, ingester)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())